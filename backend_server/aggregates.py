@@ -0,0 +1,150 @@
+# backend_server/aggregates.py
+"""
+Incrementally maintained occupancy counters and hourly rollups.
+
+  occupancy(lane, vehicle_type, inside)                          -- vehicles currently inside
+  hourly_stats(hour, lane, vehicle_type, entries, exits, revenue) -- UTC hour buckets ("YYYY-MM-DDTHH")
+
+record_entry/record_exit take the caller's cursor so they run inside the same transaction as the
+session UPDATE. `python aggregates.py rebuild` recomputes both tables from sessions in one pass.
+"""
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from archiver import archive_files
+
+
+def init_aggregate_tables(con) -> bool:
+    """Create the aggregate tables; True when they did not exist yet (caller may need to backfill)."""
+    created = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='hourly_stats'"
+    ).fetchone() is None
+    # lane / vehicle_type are stored as '' instead of NULL so they can be part of the primary key
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS occupancy (
+      lane TEXT NOT NULL,
+      vehicle_type TEXT NOT NULL,
+      inside INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (lane, vehicle_type)
+    );""")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS hourly_stats (
+      hour TEXT NOT NULL,
+      lane TEXT NOT NULL,
+      vehicle_type TEXT NOT NULL,
+      entries INTEGER NOT NULL DEFAULT 0,
+      exits INTEGER NOT NULL DEFAULT 0,
+      revenue REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY (hour, lane, vehicle_type)
+    );""")
+    return created
+
+
+def hour_bucket(iso_ts: str) -> str:
+    return iso_ts[:13]
+
+
+def record_entry(cur, lane, vehicle_type, time_in: str):
+    lane, vt = lane or "", vehicle_type or ""
+    cur.execute(
+        "INSERT INTO occupancy (lane, vehicle_type, inside) VALUES (?, ?, 1) "
+        "ON CONFLICT(lane, vehicle_type) DO UPDATE SET inside = inside + 1",
+        (lane, vt)
+    )
+    cur.execute(
+        "INSERT INTO hourly_stats (hour, lane, vehicle_type, entries) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT(hour, lane, vehicle_type) DO UPDATE SET entries = entries + 1",
+        (hour_bucket(time_in), lane, vt)
+    )
+
+
+def record_exit(cur, lane, vehicle_type, time_out: str, fee):
+    # sessions only store the entry lane, so exits are bucketed there too (keeps rebuild() identical)
+    lane, vt = lane or "", vehicle_type or ""
+    cur.execute(
+        "UPDATE occupancy SET inside = MAX(inside - 1, 0) WHERE lane=? AND vehicle_type=?",
+        (lane, vt)
+    )
+    cur.execute(
+        "INSERT INTO hourly_stats (hour, lane, vehicle_type, exits, revenue) VALUES (?, ?, ?, 1, ?) "
+        "ON CONFLICT(hour, lane, vehicle_type) DO UPDATE SET exits = exits + 1, revenue = revenue + excluded.revenue",
+        (hour_bucket(time_out), lane, vt, float(fee or 0.0))
+    )
+
+
+def read_stats(con, hours: int = 24) -> dict:
+    now = datetime.now(timezone.utc)
+    since = hour_bucket((now - timedelta(hours=max(hours - 1, 0))).isoformat())
+    occ = con.execute("SELECT lane, vehicle_type, inside FROM occupancy WHERE inside > 0").fetchall()
+    rows = con.execute(
+        "SELECT hour, lane, vehicle_type, entries, exits, revenue FROM hourly_stats "
+        "WHERE hour >= ? ORDER BY hour DESC, lane, vehicle_type",
+        (since,)
+    ).fetchall()
+    this_hour = hour_bucket(now.isoformat())
+    return {
+        "inside_total": sum(r[2] for r in occ),
+        "inside": [{"lane": r[0] or None, "vehicle_type": r[1] or None, "inside": r[2]} for r in occ],
+        "this_hour": {
+            "hour": this_hour,
+            "entries": sum(r[3] for r in rows if r[0] == this_hour),
+            "exits": sum(r[4] for r in rows if r[0] == this_hour),
+            "revenue": sum(r[5] for r in rows if r[0] == this_hour),
+        },
+        "hourly": [
+            {"hour": r[0], "lane": r[1] or None, "vehicle_type": r[2] or None,
+             "entries": r[3], "exits": r[4], "revenue": r[5]}
+            for r in rows
+        ],
+    }
+
+
+def _stream_sessions(con, archive_dir):
+    query = ("SELECT lane, vehicle_type, time_in, time_out, status, fee FROM {}sessions "
+             "WHERE status IN ('CHECKED_IN', 'CHECKED_OUT')")
+    yield from con.execute(query.format(""))
+    for _, path in archive_files(archive_dir, newest_first=False) if archive_dir else []:
+        con.execute("ATTACH DATABASE ? AS arc", (path,))
+        try:
+            yield from con.execute(query.format("arc."))
+        finally:
+            con.execute("DETACH DATABASE arc")
+
+
+def rebuild(db_path: str, archive_dir: str = None) -> dict:
+    """Recompute occupancy + hourly_stats from sessions (hot DB + archives) in a single streaming pass."""
+    occupancy, hourly = {}, {}
+    with sqlite3.connect(db_path) as con:
+        init_aggregate_tables(con)
+        for lane, vt, time_in, time_out, status, fee in _stream_sessions(con, archive_dir):
+            lane, vt = lane or "", vt or ""
+            b = hourly.setdefault((hour_bucket(time_in), lane, vt), [0, 0, 0.0])
+            b[0] += 1
+            if status == "CHECKED_IN":
+                occupancy[(lane, vt)] = occupancy.get((lane, vt), 0) + 1
+            elif time_out:
+                b = hourly.setdefault((hour_bucket(time_out), lane, vt), [0, 0, 0.0])
+                b[1] += 1
+                b[2] += float(fee or 0.0)
+        con.execute("DELETE FROM occupancy")
+        con.execute("DELETE FROM hourly_stats")
+        con.executemany("INSERT INTO occupancy (lane, vehicle_type, inside) VALUES (?, ?, ?)",
+                        ((k[0], k[1], v) for k, v in occupancy.items()))
+        con.executemany(
+            "INSERT INTO hourly_stats (hour, lane, vehicle_type, entries, exits, revenue) VALUES (?, ?, ?, ?, ?, ?)",
+            ((k[0], k[1], k[2], v[0], v[1], v[2]) for k, v in hourly.items())
+        )
+    return {"occupancy_rows": len(occupancy), "hourly_rows": len(hourly)}
+
+
+if __name__ == "__main__":
+    import argparse
+    data_dir = os.path.join(os.path.dirname(__file__), "data")
+    ap = argparse.ArgumentParser(description="Occupancy / revenue aggregates")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="Recompute aggregates from session history")
+    rb.add_argument("--db", default=os.path.join(data_dir, "parking.db"))
+    rb.add_argument("--archive-dir", default=os.path.join(data_dir, "archive"))
+    args = ap.parse_args()
+    print(rebuild(args.db, args.archive_dir))
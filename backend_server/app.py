@@ -1,20 +1,91 @@
 # backend_server/app.py
 import os, sqlite3, uuid
 import subprocess, sys
-from fastapi import FastAPI, HTTPException, Body, Header, Depends
+# File/Form (multipart uploads) need the python-multipart package at import time
+from fastapi import FastAPI, HTTPException, Body, Header, Depends, File, Form, UploadFile
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 import asyncio
+import time
+
+# Sibling modules are importable whether uvicorn runs from backend_server/ or the project root
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from plate_index import PlateIndex, normalize_plate_key, bounded_edit_distance
+from recognition_pool import RecognitionPool, PoolBusy, PoolUnavailable
+from tariff import TariffEngine
+import aggregates
+import archiver
+from card_cache import CardCache, init_cache_tables
+from evidence import EvidenceStore, MIME_EXT, init_evidence_tables, record_recognition
 
 SECRET = os.getenv("SECRET_KEY", "my-very-strong-secret")
-DB_DIR = os.path.join(os.path.dirname(__file__), "data")
+DB_DIR = os.getenv("PARKING_DATA_DIR", os.path.join(os.path.dirname(__file__), "data"))
 DB_PATH = os.path.join(DB_DIR, "parking.db")
 os.makedirs(DB_DIR, exist_ok=True)
 
+# Spawn main_app.py on startup (disabled by the load test and when the worker runs elsewhere)
+START_AI_WORKER = os.getenv("START_AI_WORKER", "1") == "1"
+
+# Manual image recognition (staff uploads)
+UPLOAD_POOL_WORKERS = int(os.getenv("UPLOAD_POOL_WORKERS", "1"))
+UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "4"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(8 * 1024 * 1024)))
+TASK_TTL_SECONDS = float(os.getenv("TASK_TTL_SECONDS", "300"))
+# Start the pool and load the models at startup instead of on the first staff upload
+UPLOAD_POOL_WARMUP = os.getenv("UPLOAD_POOL_WARMUP", "1") == "1"
+
+# Archival of closed sessions into data/archive/sessions_YYYY_MM.db
+ARCHIVE_DIR = os.path.join(DB_DIR, "archive")
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Cards/users cache: how often a lookup re-checks cache_version for edits made outside the API
+CARD_CACHE_RECHECK_SECONDS = float(os.getenv("CARD_CACHE_RECHECK_SECONDS", "5"))
+
+# Evidence snapshots (best frame + plate crop per session), evicted oldest-first above the size cap
+EVIDENCE_DIR = os.path.join(DB_DIR, "evidence")
+EVIDENCE_MAX_BYTES = int(os.getenv("EVIDENCE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Camera health reports older than this are shown as stale (worker down or unreachable)
+CAMERA_HEALTH_STALE_SECONDS = float(os.getenv("CAMERA_HEALTH_STALE_SECONDS", "30"))
+
+# Exit lanes whose camera reads the plate at check-out (comma-separated; empty = card only).
+# Check-out waits up to EXIT_VERIFY_TIMEOUT for the worker, then lets the card out unverified.
+EXIT_VERIFY_LANES = {l.strip() for l in os.getenv("EXIT_VERIFY_LANES", "").split(",") if l.strip()}
+EXIT_VERIFY_TIMEOUT = float(os.getenv("EXIT_VERIFY_TIMEOUT", "5"))
+
+# 503 detail prefix for SQLite lock timeouts (clients may retry; the load test counts these)
+SQLITE_BUSY_DETAIL = "sqlite_busy"
+
+# Active-session queries must repeat this term verbatim so SQLite can use the partial indexes
+ACTIVE_STATUS_SQL = "status IN ('PENDING_PLATE', 'CHECKED_IN')"
+
 app = FastAPI(title="Parking System Backend", version="1.2.0")
 
+def void_duplicate_active_sessions(con) -> List[str]:
+    """
+    Before the unique index exists: the old check-then-insert check-in could race and leave two
+    active sessions for one card. Keep the newest per card, mark the others VOIDED (time_out set,
+    no fee) so the index can be created. Returns the voided session ids.
+    """
+    rows = con.execute(
+        f"""SELECT session_id FROM sessions s
+            WHERE {ACTIVE_STATUS_SQL} AND EXISTS (
+              SELECT 1 FROM sessions n
+              WHERE n.card_id = s.card_id AND n.status IN ('PENDING_PLATE', 'CHECKED_IN')
+                AND (n.time_in > s.time_in OR (n.time_in = s.time_in AND n.session_id > s.session_id))
+            )"""
+    ).fetchall()
+    voided = [r[0] for r in rows]
+    now = datetime.now(timezone.utc).isoformat()
+    con.executemany("UPDATE sessions SET status='VOIDED', time_out=? WHERE session_id=?",
+                    ((now, sid) for sid in voided))
+    return voided
+
 def init_db():
+    voided = []
     with sqlite3.connect(DB_PATH) as con:
         con.execute("PRAGMA foreign_keys = ON;")
         con.execute("PRAGMA journal_mode=WAL;")
@@ -48,10 +119,29 @@ def init_db():
           FOREIGN KEY (card_id) REFERENCES cards(card_id)
         );""")
 
-        con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_card_status ON sessions(card_id, status)")
-        con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_plate_status ON sessions(plate_text, status)")
+        # Partial indexes: only active sessions, so closed history never bloats the hot path
+        con.execute("DROP INDEX IF EXISTS idx_sessions_card_status")
+        con.execute("DROP INDEX IF EXISTS idx_sessions_plate_status")
+        # UNIQUE: at most one active session per card, enforced by the check-in INSERT itself
+        con.execute("DROP INDEX IF EXISTS idx_sessions_active_card")
+        if not con.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_sessions_active_card_unique'").fetchone():
+            voided = void_duplicate_active_sessions(con)
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_active_card_unique ON sessions(card_id) WHERE {ACTIVE_STATUS_SQL}")
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_sessions_active_plate ON sessions(plate_text, status) WHERE {ACTIVE_STATUS_SQL}")
         con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_time_in ON sessions(time_in)")
 
+        aggregates_created = aggregates.init_aggregate_tables(con)
+        init_cache_tables(con)
+        init_evidence_tables(con)
+        has_sessions = con.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is not None
+
+    if voided:
+        print(f"[DB] Voided {len(voided)} duplicate active session(s) to enforce one per card: {voided}")
+    # Upgrading a DB that predates the aggregate tables (or whose occupancy counted the voided
+    # duplicates): backfill them once from history
+    if (aggregates_created and has_sessions) or voided:
+        print(f"[Aggregates] Backfilled from existing sessions: {aggregates.rebuild(DB_PATH, ARCHIVE_DIR)}")
+
 init_db()
 
 def require_secret(x_secret: Optional[str] = Header(None, alias="X-Secret")):
@@ -59,21 +149,64 @@ def require_secret(x_secret: Optional[str] = Header(None, alias="X-Secret")):
         raise HTTPException(status_code=401, detail="Unauthorized")
     return True
 
+@app.exception_handler(sqlite3.OperationalError)
+async def sqlite_operational_error(request, exc: sqlite3.OperationalError):
+    # "database is locked" / "busy": another connection held the write lock past the timeout
+    msg = str(exc).lower()
+    if "locked" in msg or "busy" in msg:
+        return JSONResponse(status_code=503, content={"detail": f"{SQLITE_BUSY_DETAIL}: {exc}"})
+    raise exc
+
 # ---- App-scoped state ----
 app.state.capture_queue = []
 app.state.barrier_command = "close"
 app.state.lock = asyncio.Lock()
+app.state.exit_waiters = {}  # session_id -> Future resolved by /exit-plate
 app.state.ai_worker_proc = None
+app.state.camera_health = {}  # lane -> last health report from the AI worker
+app.state.plate_index = PlateIndex(max_dist=1)
+app.state.plate_index.load(DB_PATH)
+app.state.tariff = TariffEngine.from_env()
+app.state.card_cache = CardCache(DB_PATH, recheck_seconds=CARD_CACHE_RECHECK_SECONDS)
+app.state.card_cache.load()
+app.state.evidence = EvidenceStore(DB_PATH, EVIDENCE_DIR, max_bytes=EVIDENCE_MAX_BYTES)
+app.state.recognition_pool = RecognitionPool(
+    workers=UPLOAD_POOL_WORKERS, max_pending=UPLOAD_MAX_PENDING, ttl_seconds=TASK_TTL_SECONDS
+)
 
 # ---- Models ----
 class CardPayload(BaseModel):
     card_id: str
     lane: Optional[str] = None
+    plate_text: Optional[str] = None  # check-out: plate already read at the exit lane, cross-verified
+
+class CardAdminPayload(BaseModel):
+    card_id: str
+    is_guest: bool = True
+
+class UserAdminPayload(BaseModel):
+    user_id: str
+    full_name: str
+    card_id: str
+    other_info: Optional[str] = None
 
 class PlateUpdatePayload(BaseModel):
     session_id: str
     plate_text: str
     vehicle_type: Optional[str] = None
+    # recognition metadata sent by the AI worker (kept in session_evidence)
+    num_frames: Optional[int] = None
+    plate_conf: Optional[float] = None
+    plate_bbox: Optional[List[int]] = None
+    num_chars: Optional[int] = None
+
+class ExitPlatePayload(BaseModel):
+    session_id: str
+    plate_text: str = ""  # empty: the worker could not read the plate
+
+class CameraHealthPayload(BaseModel):
+    cameras: List[Dict[str, Any]]
+    scheduler: Optional[Dict[str, Any]] = None
 
 # ---- API for ESP32 ----
 @app.post("/check-in", status_code=201)
@@ -81,61 +214,123 @@ async def initiate_check_in(payload: CardPayload, auth=Depends(require_secret)):
     card_id = payload.card_id.strip()
     time_in = datetime.now(timezone.utc).isoformat()
 
-    with sqlite3.connect(DB_PATH) as con:
-        con.execute("PRAGMA foreign_keys = ON;")
-        con.row_factory = sqlite3.Row
-        cur = con.cursor()
-
-        card = cur.execute("SELECT * FROM cards WHERE card_id=?", (card_id,)).fetchone()
-        if not card:
-            raise HTTPException(status_code=404, detail=f"Card '{card_id}' not found.")
+    card = app.state.card_cache.get(card_id)
+    if not card:
+        raise HTTPException(status_code=404, detail=f"Card '{card_id}' not found.")
 
-        active_session = cur.execute(
-            "SELECT 1 FROM sessions WHERE card_id=? AND status IN ('PENDING_PLATE', 'CHECKED_IN')",
-            (card_id,)
-        ).fetchone()
-        if active_session:
+    session_id = str(uuid.uuid4())
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            con.execute("PRAGMA foreign_keys = ON;")
+            con.execute(
+                "INSERT INTO sessions (session_id, time_in, card_id, lane, status) VALUES (?, ?, ?, ?, ?)",
+                (session_id, time_in, card_id, payload.lane, "PENDING_PLATE")
+            )
+    except sqlite3.IntegrityError as e:
+        # idx_sessions_active_card_unique rejects a second active session for the same card
+        if "UNIQUE" in str(e):
             raise HTTPException(status_code=409, detail=f"Card '{card_id}' is already checked in.")
-
-        session_id = str(uuid.uuid4())
-        cur.execute(
-            "INSERT INTO sessions (session_id, time_in, card_id, lane, status) VALUES (?, ?, ?, ?, ?)",
-            (session_id, time_in, card_id, payload.lane, "PENDING_PLATE")
-        )
+        app.state.card_cache.invalidate()  # card vanished (FK) -> cache was stale
+        raise HTTPException(status_code=404, detail=f"Card '{card_id}' not found.")
 
     async with app.state.lock:
-        app.state.capture_queue.append(session_id)
+        app.state.capture_queue.append({"session_id": session_id, "lane": payload.lane})
 
     return {"ok": True, "session_id": session_id, "message": "Session created. Awaiting plate capture."}
 
+async def capture_exit_plate(session_id: str, lane: str) -> Optional[str]:
+    """Ask the AI worker that owns this exit lane to read the plate; None if nothing came back in time."""
+    future = asyncio.get_running_loop().create_future()
+    task = {"session_id": session_id, "lane": lane, "kind": "exit"}
+    async with app.state.lock:
+        app.state.exit_waiters[session_id] = future
+        app.state.capture_queue.append(task)
+    try:
+        return await asyncio.wait_for(future, EXIT_VERIFY_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        async with app.state.lock:
+            app.state.exit_waiters.pop(session_id, None)
+            app.state.capture_queue = [t for t in app.state.capture_queue if t is not task]
+
+def verify_exit_plate(session, read_plate: str) -> Optional[int]:
+    """Edit distance between the exit read and the session's plate; None when the session has no plate."""
+    max_dist = app.state.plate_index.max_dist
+    session_key = normalize_plate_key(session["plate_text"])
+    if not session_key:
+        return None  # nothing to compare against; never lock the card in for that
+    distance = bounded_edit_distance(normalize_plate_key(read_plate), session_key, max_dist)
+    if distance > max_dist:
+        # the index is a hint only: which other active sessions this plate looks like
+        others = [h["session_id"] for h in app.state.plate_index.lookup(read_plate)]
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Plate does not match the active session for this card.",
+                "session_plate": session["plate_text"],
+                "read_plate": read_plate.strip().upper(),
+                "matching_sessions": others,
+            },
+        )
+    return distance
+
 @app.post("/check-out")
 async def process_check_out(payload: CardPayload, auth=Depends(require_secret)):
     card_id = payload.card_id.strip()
-    time_out = datetime.now(timezone.utc).isoformat()
 
     with sqlite3.connect(DB_PATH) as con:
-        con.execute("PRAGMA foreign_keys = ON;")
         con.row_factory = sqlite3.Row
-        cur = con.cursor()
-
-        session = cur.execute(
-            "SELECT * FROM sessions WHERE card_id=? AND status='CHECKED_IN' ORDER BY time_in DESC LIMIT 1",
+        session = con.execute(
+            f"SELECT * FROM sessions WHERE card_id=? AND status='CHECKED_IN' AND {ACTIVE_STATUS_SQL} "
+            "ORDER BY time_in DESC LIMIT 1",
             (card_id,)
         ).fetchone()
 
-        if not session:
+    if not session:
+        raise HTTPException(status_code=404, detail="No active checked-in session found for this card.")
+
+    session_id = session["session_id"]
+
+    # Exit lanes with a camera: the AI worker reads the plate now (the reader may also send one)
+    read_plate = payload.plate_text
+    if not read_plate and payload.lane in EXIT_VERIFY_LANES:
+        read_plate = await capture_exit_plate(session_id, payload.lane)
+
+    # Cross-verify against the session row already loaded (no extra DB round trip; the per-process
+    # index can miss sessions checked in through another uvicorn worker)
+    plate_distance = verify_exit_plate(session, read_plate) if read_plate else None
+
+    time_out = datetime.now(timezone.utc).isoformat()
+    card = app.state.card_cache.get(card_id)
+    is_guest = card["is_guest"] if card else True
+    fee = app.state.tariff.compute_fee(session["vehicle_type"], is_guest, session["time_in"], time_out)
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute("PRAGMA foreign_keys = ON;")
+        cur = con.cursor()
+        n = cur.execute(
+            "UPDATE sessions SET time_out=?, status='CHECKED_OUT', fee=? WHERE session_id=? AND status='CHECKED_IN'",
+            (time_out, fee, session_id)
+        ).rowcount
+        if not n:
+            # checked out concurrently while the exit plate was being read
             raise HTTPException(status_code=404, detail="No active checked-in session found for this card.")
+        aggregates.record_exit(cur, session["lane"], session["vehicle_type"], time_out, fee)
 
-        session_id = session["session_id"]
-        cur.execute(
-            "UPDATE sessions SET time_out=?, status='CHECKED_OUT' WHERE session_id=?",
-            (time_out, session_id)
-        )
+    app.state.plate_index.discard(session_id)
 
     async with app.state.lock:
         app.state.barrier_command = "open"
 
-    return {"ok": True, "session_id": session_id, "message": "Check-out successful."}
+    return {
+        "ok": True,
+        "session_id": session_id,
+        "plate_read": read_plate.strip().upper() if read_plate else None,
+        "plate_verified": plate_distance is not None,
+        "plate_distance": plate_distance,
+        "fee": fee,
+        "message": "Check-out successful.",
+    }
 
 @app.get("/barrier-command")
 async def consume_barrier_command(auth=Depends(require_secret)):
@@ -147,14 +342,19 @@ async def consume_barrier_command(auth=Depends(require_secret)):
 
 # ---- API for AI Worker ----
 @app.get("/capture-task")
-async def get_capture_task(auth=Depends(require_secret)):
-    session_id = None
+async def get_capture_task(lanes: Optional[str] = None, auth=Depends(require_secret)):
+    # lanes: comma-separated lanes this worker has cameras for; tasks without a lane go to anyone
+    wanted = {l.strip() for l in lanes.split(",") if l.strip()} if lanes else None
+    task = None
     async with app.state.lock:
-        if app.state.capture_queue:
-            session_id = app.state.capture_queue.pop(0)
-
-    if session_id:
-        return {"task": "capture_plate", "session_id": session_id}
+        for i, t in enumerate(app.state.capture_queue):
+            if wanted is None or t["lane"] is None or t["lane"] in wanted:
+                task = app.state.capture_queue.pop(i)
+                break
+
+    if task:
+        kind = "capture_exit_plate" if task.get("kind") == "exit" else "capture_plate"
+        return {"task": kind, "session_id": task["session_id"], "lane": task["lane"]}
     else:
         return {"task": "none"}
 
@@ -180,26 +380,239 @@ async def update_session_plate(payload: PlateUpdatePayload, auth=Depends(require
             "UPDATE sessions SET plate_text=?, vehicle_type=?, status='CHECKED_IN' WHERE session_id=?",
             (plate_text, payload.vehicle_type, session_id)
         )
+        aggregates.record_entry(cur, session["lane"], payload.vehicle_type, session["time_in"])
+        if payload.plate_conf is not None or payload.plate_bbox is not None or payload.num_frames is not None:
+            record_recognition(cur, session_id, payload.plate_conf, payload.plate_bbox,
+                               payload.num_frames, payload.num_chars)
+
+    app.state.plate_index.add(session_id, plate_text, session["card_id"])
 
     async with app.state.lock:
         app.state.barrier_command = "open"
 
     return {"ok": True, "message": f"Plate for session {session_id} updated."}
 
+@app.post("/exit-plate")
+async def report_exit_plate(payload: ExitPlatePayload, auth=Depends(require_secret)):
+    async with app.state.lock:
+        future = app.state.exit_waiters.get(payload.session_id)
+        if future is None or future.done():
+            raise HTTPException(status_code=404, detail=f"No check-out is waiting for session '{payload.session_id}'.")
+        future.set_result(payload.plate_text.strip().upper())
+    return {"ok": True}
+
+# ---- API for manual capture (StaffView) ----
+@app.post("/upload-image", status_code=202)
+async def upload_image(image: UploadFile = File(...), session_id: Optional[str] = Form(None),
+                       auth=Depends(require_secret)):
+    data = await image.read()
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image.")
+    if len(data) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large.")
+    try:
+        task_id = app.state.recognition_pool.submit(data, session_id=session_id)
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail="Recognition busy, try again shortly.")
+    except PoolUnavailable:
+        raise HTTPException(status_code=503, detail="Recognition workers restarting, try again shortly.")
+    return {"ok": True, "task_id": task_id, "status": "pending"}
+
+@app.get("/task-status/{task_id}")
+async def get_task_status(task_id: str, auth=Depends(require_secret)):
+    task = app.state.recognition_pool.status(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task '{task_id}' not found or expired.")
+    return {"task_id": task_id, **task}
+
+@app.post("/evidence/{session_id}", status_code=201)
+async def upload_evidence(session_id: str, frame: Optional[UploadFile] = File(None),
+                          crop: Optional[UploadFile] = File(None), auth=Depends(require_secret)):
+    # Best frame + plate crop from the AI worker, already WebP/JPEG encoded
+    parts = {}
+    for name, upload in (("frame", frame), ("crop", crop)):
+        if upload is None:
+            continue
+        if upload.content_type not in MIME_EXT:
+            raise HTTPException(status_code=415, detail=f"Unsupported image type '{upload.content_type}'.")
+        data = await upload.read()
+        if len(data) > UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large.")
+        if data:
+            parts[name] = (data, upload.content_type)
+    if not parts:
+        raise HTTPException(status_code=400, detail="No evidence image.")
+
+    with sqlite3.connect(DB_PATH) as con:
+        if not con.execute("SELECT 1 FROM sessions WHERE session_id=?", (session_id,)).fetchone():
+            raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found.")
+
+    # Hashing + file writes + eviction run off the event loop
+    stored = await asyncio.to_thread(app.state.evidence.put, session_id, parts.get("frame"), parts.get("crop"))
+    return {"ok": True, **stored}
+
+@app.post("/camera-health")
+async def report_camera_health(payload: CameraHealthPayload, auth=Depends(require_secret)):
+    # Per-lane stream health pushed by the AI worker (fps, reconnects, last frame age)
+    now = time.monotonic()
+    reported_at = datetime.now(timezone.utc).isoformat()
+    async with app.state.lock:
+        for cam in payload.cameras:
+            lane = cam.get("lane") or "default"
+            app.state.camera_health[lane] = {
+                **cam, "lane": lane, "reported_at": reported_at, "_received": now,
+                "scheduler": (payload.scheduler or {}).get("per_camera", {}).get(cam.get("lane") or "null"),
+            }
+    return {"message": "ok"}
+
 # ---- API for Monitoring ----
 @app.get("/events")
-async def list_events(limit: int = 50, auth=Depends(require_secret)):
+async def list_events(limit: int = 50, archive: bool = False, auth=Depends(require_secret)):
     with sqlite3.connect(DB_PATH) as con:
         con.row_factory = sqlite3.Row
-        rows = con.execute(
-            "SELECT * FROM sessions ORDER BY time_in DESC LIMIT ?",
-            (limit,)
-        ).fetchall()
-    return {"events": [dict(r) for r in rows]}
+        rows = archiver.read_events(con, ARCHIVE_DIR, limit, include_archive=archive)
+    return {"events": rows}
+
+@app.get("/stats")
+async def get_stats(hours: int = 24, auth=Depends(require_secret)):
+    # Reads the incrementally maintained aggregate tables only (never scans sessions)
+    with sqlite3.connect(DB_PATH) as con:
+        return aggregates.read_stats(con, hours=hours)
+
+@app.get("/camera-health")
+async def get_camera_health(auth=Depends(require_secret)):
+    # A lane whose worker stopped reporting is flagged stale instead of showing old numbers as live
+    now = time.monotonic()
+    async with app.state.lock:
+        entries = list(app.state.camera_health.values())
+    cameras = []
+    for entry in entries:
+        cam = {k: v for k, v in entry.items() if k != "_received"}
+        cam["stale"] = now - entry["_received"] > CAMERA_HEALTH_STALE_SECONDS
+        cameras.append(cam)
+    return {"cameras": sorted(cameras, key=lambda c: c["lane"])}
+
+@app.get("/evidence/{session_id}")
+async def get_session_evidence(session_id: str, auth=Depends(require_secret)):
+    evidence = app.state.evidence.get_session(session_id)
+    if not evidence:
+        raise HTTPException(status_code=404, detail=f"No evidence for session '{session_id}'.")
+    for kind in ("frame", "crop"):
+        sha = evidence[f"{kind}_sha256"]
+        evidence[f"{kind}_url"] = f"/evidence/blob/{sha}" if sha else None
+    return evidence
+
+@app.get("/evidence/blob/{sha256}")
+async def stream_evidence_blob(sha256: str, auth=Depends(require_secret)):
+    blob = app.state.evidence.open_blob(sha256)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Evidence not found or evicted.")
+    path, mime, size = blob
+
+    def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    # Content-addressed: the bytes behind a hash never change
+    headers = {"Content-Length": str(size), "ETag": f'"{sha256}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    return StreamingResponse(chunks(), media_type=mime, headers=headers)
+
+@app.get("/plate-lookup")
+async def lookup_active_plate(plate: str, auth=Depends(require_secret)):
+    # Served from the in-memory index of CHECKED_IN sessions (tolerates 1 OCR edit)
+    return {"plate": plate, "matches": app.state.plate_index.lookup(plate)}
+
+@app.get("/cards/{card_id}")
+async def get_card_info(card_id: str, auth=Depends(require_secret)):
+    # Card + registered user (StaffView memberInfo), served from the in-process cache
+    card = app.state.card_cache.get(card_id.strip())
+    if not card:
+        raise HTTPException(status_code=404, detail=f"Card '{card_id}' not found.")
+    return card
+
+# ---- Admin: cards / registered users (every write invalidates the card cache) ----
+@app.post("/admin/cards", status_code=201)
+async def upsert_card(payload: CardAdminPayload, auth=Depends(require_secret)):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute(
+            "INSERT INTO cards (card_id, is_guest) VALUES (?, ?) "
+            "ON CONFLICT(card_id) DO UPDATE SET is_guest=excluded.is_guest",
+            (payload.card_id.strip(), payload.is_guest)
+        )
+    app.state.card_cache.invalidate()
+    return {"ok": True, "card_id": payload.card_id.strip()}
+
+@app.delete("/admin/cards/{card_id}")
+async def delete_card(card_id: str, auth=Depends(require_secret)):
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            con.execute("PRAGMA foreign_keys = ON;")
+            n = con.execute("DELETE FROM cards WHERE card_id=?", (card_id,)).rowcount
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail=f"Card '{card_id}' is still referenced by users or sessions.")
+    app.state.card_cache.invalidate()
+    if not n:
+        raise HTTPException(status_code=404, detail=f"Card '{card_id}' not found.")
+    return {"ok": True}
+
+@app.post("/admin/users", status_code=201)
+async def upsert_registered_user(payload: UserAdminPayload, auth=Depends(require_secret)):
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            con.execute("PRAGMA foreign_keys = ON;")
+            con.execute(
+                "INSERT INTO registered_users (user_id, full_name, card_id, other_info) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET full_name=excluded.full_name, "
+                "card_id=excluded.card_id, other_info=excluded.other_info",
+                (payload.user_id, payload.full_name, payload.card_id.strip(), payload.other_info)
+            )
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(status_code=409, detail=f"Cannot save user: {e}")
+    app.state.card_cache.invalidate()
+    return {"ok": True, "user_id": payload.user_id}
+
+@app.delete("/admin/users/{user_id}")
+async def delete_registered_user(user_id: str, auth=Depends(require_secret)):
+    with sqlite3.connect(DB_PATH) as con:
+        n = con.execute("DELETE FROM registered_users WHERE user_id=?", (user_id,)).rowcount
+    app.state.card_cache.invalidate()
+    if not n:
+        raise HTTPException(status_code=404, detail=f"User '{user_id}' not found.")
+    return {"ok": True}
+
+# ---- Background archiver ----
+async def _archive_loop():
+    while True:
+        try:
+            moved = await asyncio.to_thread(
+                archiver.archive_closed_sessions, DB_PATH, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS
+            )
+            if moved:
+                print(f"[Archiver] Moved sessions: {moved}")
+        except Exception as e:
+            print(f"[Archiver] Failed: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_archiver():
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        app.state.archiver_task = asyncio.create_task(_archive_loop())
+
+@app.on_event("shutdown")
+async def stop_archiver():
+    task = getattr(app.state, "archiver_task", None)
+    if task:
+        task.cancel()
 
 # ---- Lifecycle events: start/stop AI worker ----
 @app.on_event("startup")
 async def start_ai_worker():
+    if not START_AI_WORKER:
+        return
     try:
         # Avoid duplicate workers if already running
         existing = getattr(app.state, "ai_worker_proc", None)
@@ -225,6 +638,15 @@ async def start_ai_worker():
         print(f"[AI Worker] Failed to start: {e}")
 
 
+@app.on_event("startup")
+async def warm_up_recognition_pool():
+    if UPLOAD_POOL_WARMUP:
+        app.state.recognition_pool.warm_up()
+
+@app.on_event("shutdown")
+async def stop_recognition_pool():
+    app.state.recognition_pool.shutdown()
+
 @app.on_event("shutdown")
 async def stop_ai_worker():
     proc = getattr(app.state, "ai_worker_proc", None)
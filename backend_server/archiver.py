@@ -0,0 +1,138 @@
+# backend_server/archiver.py
+"""
+Moves closed sessions out of the hot parking.db into monthly archive databases
+(data/archive/sessions_YYYY_MM.db, keyed by the month of time_in).
+
+The hot DB keeps only active + recently closed sessions, so the partial indexes used by
+check-in/check-out stay small. Archives are read back through ATTACH (see read_events).
+
+Each month is moved with INSERT OR IGNORE + DELETE inside one transaction. With the hot DB in
+WAL mode SQLite does not guarantee atomicity across attached files, but the move is idempotent:
+a crash in between leaves rows in both places and the next run just deletes the hot copies.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+ARCHIVE_RE = re.compile(r"^sessions_(\d{4})_(\d{2})\.db$")
+
+SESSION_COLUMNS = "session_id, plate_text, vehicle_type, time_in, time_out, card_id, lane, status, fee"
+
+
+def archive_path(archive_dir: str, month: str) -> str:
+    """month: 'YYYY-MM'"""
+    return os.path.join(archive_dir, f"sessions_{month.replace('-', '_')}.db")
+
+
+def archive_files(archive_dir: str, newest_first: bool = True):
+    """-> list (month 'YYYY-MM', path)"""
+    if not os.path.isdir(archive_dir):
+        return []
+    out = []
+    for name in os.listdir(archive_dir):
+        m = ARCHIVE_RE.match(name)
+        if m:
+            out.append((f"{m.group(1)}-{m.group(2)}", os.path.join(archive_dir, name)))
+    out.sort(reverse=newest_first)
+    return out
+
+
+def _init_archive_schema(con, alias: str):
+    con.execute(f"""
+    CREATE TABLE IF NOT EXISTS {alias}.sessions (
+      session_id TEXT PRIMARY KEY,
+      plate_text TEXT,
+      vehicle_type TEXT,
+      time_in TEXT NOT NULL,
+      time_out TEXT,
+      card_id TEXT NOT NULL,
+      lane TEXT,
+      status TEXT NOT NULL,
+      fee REAL
+    );""")
+    con.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_sessions_time_in ON sessions(time_in)")
+    con.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_sessions_plate ON sessions(plate_text)")
+
+
+def archive_closed_sessions(db_path: str, archive_dir: str, older_than_days: float = 30,
+                            vacuum: bool = False, vacuum_min_rows: int = 1000) -> dict:
+    """
+    Archive CHECKED_OUT sessions whose time_out is older than the cutoff. Returns {month: rows}.
+    vacuum=True also rebuilds the hot DB file after large moves; VACUUM takes an exclusive lock
+    for the whole rewrite, so only ask for it in a maintenance window (CLI --vacuum).
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    moved = {}
+    con = sqlite3.connect(db_path, isolation_level=None)  # manual transactions
+    try:
+        months = [r[0] for r in con.execute(
+            "SELECT DISTINCT substr(time_in, 1, 7) FROM sessions WHERE status='CHECKED_OUT' AND time_out < ?",
+            (cutoff,)
+        )]
+        for month in months:
+            con.execute("ATTACH DATABASE ? AS arc", (archive_path(archive_dir, month),))
+            try:
+                _init_archive_schema(con, "arc")
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    cond = "status='CHECKED_OUT' AND time_out < ? AND substr(time_in, 1, 7) = ?"
+                    con.execute(
+                        f"INSERT OR IGNORE INTO arc.sessions ({SESSION_COLUMNS}) "
+                        f"SELECT {SESSION_COLUMNS} FROM main.sessions WHERE {cond}",
+                        (cutoff, month)
+                    )
+                    n = con.execute(f"DELETE FROM main.sessions WHERE {cond}", (cutoff, month)).rowcount
+                    con.execute("COMMIT")
+                except Exception:
+                    con.execute("ROLLBACK")
+                    raise
+                moved[month] = n
+            finally:
+                con.execute("DETACH DATABASE arc")
+
+        # compact the hot DB: fold the WAL back, and (maintenance only) rebuild the file after large moves
+        if vacuum and sum(moved.values()) >= vacuum_min_rows:
+            con.execute("VACUUM")
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        con.close()
+    return moved
+
+
+def read_events(con, archive_dir: str, limit: int, include_archive: bool):
+    """Newest sessions from the hot DB, topped up from archive months via ATTACH when requested."""
+    rows = [dict(r) for r in con.execute(
+        f"SELECT {SESSION_COLUMNS} FROM sessions ORDER BY time_in DESC LIMIT ?", (limit,)
+    )]
+    if not include_archive:
+        return rows
+    for month, path in archive_files(archive_dir, newest_first=True):
+        # archives are disjoint months; once we have `limit` rows newer than this month, stop
+        if limit <= 0 or len(rows) >= limit and rows[limit - 1]["time_in"][:7] > month:
+            break
+        con.execute("ATTACH DATABASE ? AS arc", (path,))
+        try:
+            rows.extend(dict(r) for r in con.execute(
+                f"SELECT {SESSION_COLUMNS} FROM arc.sessions ORDER BY time_in DESC LIMIT ?", (limit,)
+            ))
+        finally:
+            con.execute("DETACH DATABASE arc")
+        rows.sort(key=lambda r: r["time_in"], reverse=True)
+        del rows[limit:]
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    data_dir = os.path.join(os.path.dirname(__file__), "data")
+    ap = argparse.ArgumentParser(description="Archive closed sessions into monthly databases")
+    ap.add_argument("--db", default=os.path.join(data_dir, "parking.db"))
+    ap.add_argument("--archive-dir", default=os.path.join(data_dir, "archive"))
+    ap.add_argument("--older-than-days", type=float, default=30)
+    ap.add_argument("--vacuum", action="store_true",
+                    help="VACUUM the hot DB after large moves (blocks the backend; maintenance window only)")
+    args = ap.parse_args()
+    print(archive_closed_sessions(args.db, args.archive_dir, older_than_days=args.older_than_days,
+                                  vacuum=args.vacuum))
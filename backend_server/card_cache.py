@@ -0,0 +1,81 @@
+# backend_server/card_cache.py
+"""
+In-process cache of cards + registered_users keyed by card_id.
+
+Invalidation:
+  - admin write paths call invalidate() -> the next lookup re-checks immediately
+  - triggers on cards/registered_users bump cache_version, so edits made outside the API
+    (e.g. a DB browser) are picked up within `recheck_seconds`
+A lookup normally touches no SQLite at all.
+"""
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+_WATCHED_TABLES = ("cards", "registered_users")
+
+
+def init_cache_tables(con):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS cache_version (
+      name TEXT PRIMARY KEY,
+      version INTEGER NOT NULL
+    );""")
+    con.execute("INSERT OR IGNORE INTO cache_version (name, version) VALUES ('cards', 0)")
+    for table in _WATCHED_TABLES:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            con.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version AFTER {op} ON {table}
+            BEGIN
+              UPDATE cache_version SET version = version + 1 WHERE name = 'cards';
+            END;""")
+
+
+class CardCache:
+    def __init__(self, db_path: str, recheck_seconds: float = 5.0):
+        self.db_path = db_path
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._cards = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def load(self) -> int:
+        with sqlite3.connect(self.db_path) as con:
+            version = con.execute("SELECT version FROM cache_version WHERE name='cards'").fetchone()
+            rows = con.execute(
+                "SELECT c.card_id, c.is_guest, u.user_id, u.full_name, u.other_info "
+                "FROM cards c LEFT JOIN registered_users u ON u.card_id = c.card_id"
+            ).fetchall()
+        cards = {}
+        for card_id, is_guest, user_id, full_name, other_info in rows:
+            user = None
+            if user_id is not None:
+                user = {"user_id": user_id, "full_name": full_name, "other_info": other_info}
+            cards[card_id] = {"card_id": card_id, "is_guest": bool(is_guest), "user": user}
+        with self._lock:
+            self._cards = cards
+            self._version = version[0] if version else None
+            self._checked_at = time.monotonic()
+        return len(cards)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = 0.0
+
+    def get(self, card_id: str) -> Optional[dict]:
+        self._maybe_refresh()
+        return self._cards.get(card_id)
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._checked_at < self.recheck_seconds:
+            return
+        with sqlite3.connect(self.db_path) as con:
+            row = con.execute("SELECT version FROM cache_version WHERE name='cards'").fetchone()
+        version = row[0] if row else None
+        if version != self._version:
+            self.load()
+        else:
+            with self._lock:
+                self._checked_at = time.monotonic()
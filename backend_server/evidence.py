@@ -0,0 +1,170 @@
+# backend_server/evidence.py
+"""
+Evidence snapshots per session (best frame + plate crop) in a content-addressed store.
+
+Blobs live at data/evidence/<sha[:2]>/<sha>.<ext>, so identical images (a parked car seen
+twice, a re-sent upload) are stored once. Metadata lives in the hot DB:
+
+  evidence_blobs(sha256, mime, size_bytes, created_at)   -- one row per file on disk
+  session_evidence(session_id, plate_conf, plate_bbox, num_frames, num_chars,
+                   frame_sha256, crop_sha256, created_at) -- recognition metadata per session
+
+Retention is size based: when the blobs exceed max_bytes, the oldest are evicted down to
+low_water * max_bytes, and session_evidence keeps its metadata with the hash set to NULL.
+Images arrive already encoded (WebP/JPEG) from the AI worker; nothing is re-encoded here.
+"""
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+MIME_EXT = {"image/webp": "webp", "image/jpeg": "jpg", "image/png": "png"}
+
+
+def init_evidence_tables(con: sqlite3.Connection):
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS evidence_blobs (
+      sha256 TEXT PRIMARY KEY,
+      mime TEXT NOT NULL,
+      size_bytes INTEGER NOT NULL,
+      created_at TEXT NOT NULL
+    );""")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_evidence_blobs_created ON evidence_blobs(created_at)")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS session_evidence (
+      session_id TEXT PRIMARY KEY,
+      plate_conf REAL,
+      plate_bbox TEXT,
+      num_frames INTEGER,
+      num_chars INTEGER,
+      frame_sha256 TEXT,
+      crop_sha256 TEXT,
+      created_at TEXT NOT NULL
+    );""")
+    # eviction clears references by hash
+    con.execute("CREATE INDEX IF NOT EXISTS idx_session_evidence_frame ON session_evidence(frame_sha256) WHERE frame_sha256 IS NOT NULL")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_session_evidence_crop ON session_evidence(crop_sha256) WHERE crop_sha256 IS NOT NULL")
+
+
+def record_recognition(cur: sqlite3.Cursor, session_id: str, plate_conf=None, plate_bbox=None,
+                       num_frames=None, num_chars=None):
+    """Recognition metadata from /update-plate; call inside the same transaction."""
+    cur.execute(
+        """INSERT INTO session_evidence (session_id, plate_conf, plate_bbox, num_frames, num_chars, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(session_id) DO UPDATE SET
+             plate_conf=excluded.plate_conf, plate_bbox=excluded.plate_bbox,
+             num_frames=excluded.num_frames, num_chars=excluded.num_chars""",
+        (session_id, plate_conf, json.dumps(plate_bbox) if plate_bbox is not None else None,
+         num_frames, num_chars, datetime.now(timezone.utc).isoformat())
+    )
+
+
+class EvidenceStore:
+    def __init__(self, db_path: str, root: str, max_bytes: int, low_water: float = 0.9):
+        self.db_path = db_path
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.low_water = float(low_water)
+        self._lock = threading.Lock()  # serializes put/evict (called from worker threads)
+        self._total = None             # bytes on disk, loaded lazily from evidence_blobs
+
+    def blob_path(self, sha256: str, mime: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{MIME_EXT.get(mime, 'bin')}")
+
+    def _load_total(self, con):
+        if self._total is None:
+            self._total = con.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM evidence_blobs").fetchone()[0]
+
+    def _put_blob(self, con, data: bytes, mime: str) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        if con.execute("SELECT 1 FROM evidence_blobs WHERE sha256=?", (sha,)).fetchone():
+            return sha  # already stored
+        path = self.blob_path(sha, mime)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # readers never see a half-written file
+        con.execute(
+            "INSERT INTO evidence_blobs (sha256, mime, size_bytes, created_at) VALUES (?, ?, ?, ?)",
+            (sha, mime, len(data), datetime.now(timezone.utc).isoformat())
+        )
+        self._total += len(data)
+        return sha
+
+    def put(self, session_id: str, frame: Optional[tuple] = None, crop: Optional[tuple] = None) -> dict:
+        """
+        frame / crop: (bytes, mime). Blocking (disk + sqlite); run it off the event loop.
+        -> {"frame_sha256", "crop_sha256", "evicted"}
+        """
+        with self._lock:
+            try:
+                return self._put(session_id, frame, crop)
+            except Exception:
+                self._total = None  # transaction rolled back -> recount next time
+                raise
+
+    def _put(self, session_id, frame, crop):
+        with sqlite3.connect(self.db_path) as con:
+            self._load_total(con)
+            frame_sha = self._put_blob(con, *frame) if frame else None
+            crop_sha = self._put_blob(con, *crop) if crop else None
+            con.execute(
+                """INSERT INTO session_evidence (session_id, frame_sha256, crop_sha256, created_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET
+                     frame_sha256=COALESCE(excluded.frame_sha256, frame_sha256),
+                     crop_sha256=COALESCE(excluded.crop_sha256, crop_sha256)""",
+                (session_id, frame_sha, crop_sha, datetime.now(timezone.utc).isoformat())
+            )
+            evicted = self._evict(con) if self._total > self.max_bytes else 0
+        return {"frame_sha256": frame_sha, "crop_sha256": crop_sha, "evicted": evicted}
+
+    def _evict(self, con) -> int:
+        target = int(self.max_bytes * self.low_water)
+        evicted = 0
+        rows = con.execute("SELECT sha256, mime, size_bytes FROM evidence_blobs ORDER BY created_at").fetchall()
+        for sha, mime, size in rows:
+            if self._total <= target:
+                break
+            con.execute("DELETE FROM evidence_blobs WHERE sha256=?", (sha,))
+            con.execute("UPDATE session_evidence SET frame_sha256=NULL WHERE frame_sha256=?", (sha,))
+            con.execute("UPDATE session_evidence SET crop_sha256=NULL WHERE crop_sha256=?", (sha,))
+            try:
+                os.remove(self.blob_path(sha, mime))
+            except FileNotFoundError:
+                pass
+            self._total -= size
+            evicted += 1
+        return evicted
+
+    def get_session(self, session_id: str) -> Optional[dict]:
+        with sqlite3.connect(self.db_path) as con:
+            con.row_factory = sqlite3.Row
+            row = con.execute("SELECT * FROM session_evidence WHERE session_id=?", (session_id,)).fetchone()
+        if not row:
+            return None
+        out = dict(row)
+        out["plate_bbox"] = json.loads(out["plate_bbox"]) if out["plate_bbox"] else None
+        return out
+
+    def open_blob(self, sha256: str):
+        """-> (path, mime, size) or None."""
+        with sqlite3.connect(self.db_path) as con:
+            row = con.execute("SELECT mime, size_bytes FROM evidence_blobs WHERE sha256=?", (sha256,)).fetchone()
+        if not row:
+            return None
+        path = self.blob_path(sha256, row[0])
+        if not os.path.exists(path):
+            return None
+        return path, row[0], row[1]
+
+    def usage(self) -> dict:
+        with self._lock, sqlite3.connect(self.db_path) as con:
+            self._load_total(con)
+            count = con.execute("SELECT COUNT(*) FROM evidence_blobs").fetchone()[0]
+        return {"blobs": count, "bytes": self._total, "max_bytes": self.max_bytes}
@@ -0,0 +1,282 @@
+# backend_server/loadtest.py
+"""
+Load / soak test for the backend: N simulated ESP32 card readers and M simulated AI workers.
+
+Each reader owns a lane and a pool of cards. It polls /barrier-command like the firmware
+does and, at random (exponential) intervals, either checks a free card in or checks a
+parked one out. Workers claim lanes and poll /capture-task; when a task arrives they
+"infer" for --infer-ms and then POST /update-plate with recognition metadata.
+
+By default the app runs in-process through httpx.ASGITransport against a throw-away data
+dir (PARKING_DATA_DIR), with no network, AI worker, archiver or model files, so it runs
+offline in CI. In that mode every request runs on this one event loop and the SQLite calls
+are synchronous, so writes never overlap: the in-process numbers cannot show database
+contention and the busy count stays at 0. They measure per-request cost and app.state.lock
+waits only. Use --url to load a real server for contention (e.g. uvicorn --workers 4, or
+several uvicorn processes on one data dir).
+
+The backend answers a SQLite lock timeout with 503 and a detail starting with "sqlite_busy";
+those responses are counted as busy errors.
+
+Reported: throughput, p50/p99 latency per endpoint, status codes, app.state.lock
+contention (in-process only), SQLite busy errors, and for soaks the RSS and DB growth.
+Exits with status 1 when the error rate exceeds --max-error-rate.
+
+  python loadtest.py --readers 8 --workers 2 --duration 60
+  python loadtest.py --readers 4 --workers 1 --duration 3600 --report-every 300   # soak
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+from collections import defaultdict
+
+import httpx
+
+SECRET = "loadtest-secret"
+BUSY_DETAIL = "sqlite_busy"  # 503 detail prefix from the backend's sqlite3.OperationalError handler
+
+
+class InstrumentedLock(asyncio.Lock):
+    """asyncio.Lock that records how often and how long acquirers had to wait."""
+
+    def __init__(self):
+        super().__init__()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def acquire(self):
+        contended = self.locked()
+        t0 = time.perf_counter()
+        await super().acquire()
+        waited = time.perf_counter() - t0
+        self.acquisitions += 1
+        if contended:
+            self.contended += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return True
+
+    def report(self):
+        n = self.acquisitions
+        return {
+            "acquisitions": n,
+            "contended_pct": round(100.0 * self.contended / n, 2) if n else 0.0,
+            "wait_avg_ms": round(1000.0 * self.wait_total / n, 3) if n else 0.0,
+            "wait_max_ms": round(1000.0 * self.wait_max, 3),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.latency = defaultdict(list)                         # endpoint -> [seconds]
+        self.status = defaultdict(lambda: defaultdict(int))      # endpoint -> status -> count
+        self.busy_errors = 0
+        self.errors = 0
+        self.checkins = 0
+        self.checkouts = 0
+        self.plates = 0
+
+    async def call(self, client, method, endpoint, **kw):
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, endpoint, **kw)
+        except Exception as e:
+            # in-process: unhandled app exceptions surface here instead of as a 500
+            self.latency[endpoint].append(time.perf_counter() - t0)
+            self.status[endpoint][type(e).__name__] += 1
+            self.errors += 1
+            return None
+        self.latency[endpoint].append(time.perf_counter() - t0)
+        self.status[endpoint][r.status_code] += 1
+        if r.status_code >= 500:
+            self.errors += 1
+            if r.status_code == 503 and self._is_busy(r):
+                self.busy_errors += 1
+        return r
+
+    @staticmethod
+    def _is_busy(r):
+        try:
+            detail = r.json().get("detail")
+        except (ValueError, AttributeError):
+            return False
+        return isinstance(detail, str) and detail.startswith(BUSY_DETAIL)
+
+    def total_requests(self):
+        return sum(len(v) for v in self.latency.values())
+
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def random_plate(rng):
+    return f"{rng.randint(11, 99)}{rng.choice('ABCDEFGHKLMNPSTUVXYZ')} {rng.randint(10000, 99999)}"
+
+
+# ---- simulated devices ----
+async def esp32_reader(client, metrics, lane, cards, args, stop_at, rng):
+    free = list(cards)
+    parked = []  # cards with a session (plate may still be pending)
+    next_event = time.monotonic() + rng.expovariate(1.0 / args.event_interval)
+    while time.monotonic() < stop_at:
+        await metrics.call(client, "GET", "/barrier-command")
+        if time.monotonic() >= next_event:
+            next_event = time.monotonic() + rng.expovariate(1.0 / args.event_interval)
+            if parked and (not free or rng.random() < 0.5):
+                card = parked.pop(rng.randrange(len(parked)))
+                r = await metrics.call(client, "POST", "/check-out", json={"card_id": card, "lane": lane})
+                if r is not None and r.status_code == 200:
+                    metrics.checkouts += 1
+                    free.append(card)
+                elif r is not None and r.status_code == 404:
+                    parked.append(card)  # plate not in yet -> try again later
+            elif free:
+                card = free.pop(rng.randrange(len(free)))
+                r = await metrics.call(client, "POST", "/check-in", json={"card_id": card, "lane": lane})
+                if r is not None and r.status_code == 201:
+                    metrics.checkins += 1
+                    parked.append(card)
+                else:
+                    free.append(card)
+        await asyncio.sleep(args.barrier_poll)
+
+
+async def ai_worker(client, metrics, lanes, args, stop_at, rng):
+    params = {"lanes": ",".join(lanes)} if lanes else None
+    while time.monotonic() < stop_at:
+        r = await metrics.call(client, "GET", "/capture-task", params=params)
+        task = r.json() if r is not None and r.status_code == 200 else {}
+        if task.get("task") != "capture_plate":
+            await asyncio.sleep(args.task_poll)
+            continue
+        await asyncio.sleep(args.infer_ms / 1000.0)  # burst + inference
+        r = await metrics.call(client, "POST", "/update-plate", json={
+            "session_id": task["session_id"],
+            "plate_text": random_plate(rng),
+            "vehicle_type": rng.choice(["car", "motorbike"]),
+            "num_frames": rng.randint(1, 3),
+            "plate_conf": round(rng.uniform(0.5, 0.99), 3),
+            "plate_bbox": [100, 200, 260, 250],
+            "num_chars": 8,
+        })
+        if r is not None and r.status_code == 200:
+            metrics.plates += 1
+
+
+# ---- reporting ----
+def print_report(metrics, elapsed, lock, db_path, rss0, db0, final):
+    total = metrics.total_requests()
+    title = "RESULT" if final else "PROGRESS"
+    print(f"\n== {title} after {elapsed:.0f}s: {total} requests, {total / max(elapsed, 1e-9):.1f} req/s, "
+          f"{metrics.checkins} check-ins, {metrics.plates} plates, {metrics.checkouts} check-outs ==")
+    print(f"{'endpoint':<18}{'count':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}  status")
+    for endpoint in sorted(metrics.latency):
+        vals = sorted(metrics.latency[endpoint])
+        codes = ", ".join(f"{k}:{v}" for k, v in sorted(metrics.status[endpoint].items(), key=lambda kv: str(kv[0])))
+        print(f"{endpoint:<18}{len(vals):>8}{percentile(vals, 50) * 1000:>9.1f}"
+              f"{percentile(vals, 99) * 1000:>9.1f}{vals[-1] * 1000:>9.1f}  {codes}")
+    print(f"errors (5xx/exceptions): {metrics.errors}   sqlite busy/locked: {metrics.busy_errors}")
+    if lock is not None:
+        print(f"app.state.lock: {lock.report()}")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    line = f"max RSS: {rss:.1f} MB (+{rss - rss0:.1f})"
+    if db_path and os.path.exists(db_path):
+        size = sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p)) / 1e6
+        line += f"   db+wal: {size:.2f} MB (+{size - db0:.2f})"
+    print(line)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    lock, db_path = None, None
+
+    if args.url:
+        transport = None
+        base_url = args.url.rstrip("/")
+        secret = args.secret
+    else:
+        data_dir = tempfile.mkdtemp(prefix="parking-loadtest-")
+        os.environ.update({
+            "PARKING_DATA_DIR": data_dir, "SECRET_KEY": SECRET, "START_AI_WORKER": "0",
+            "ARCHIVE_INTERVAL_SECONDS": "0", "UPLOAD_POOL_WARMUP": "0",
+        })
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as backend  # reads the env above at import time
+        lock = backend.app.state.lock = InstrumentedLock()
+        db_path = backend.DB_PATH
+        transport = httpx.ASGITransport(app=backend.app)
+        base_url = "http://loadtest"
+        secret = SECRET
+        print(f"In-process backend, data dir {data_dir}")
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url,
+                                 headers={"X-Secret": secret}, timeout=args.timeout) as client:
+        # seed cards: each reader gets its own pool so readers never fight over a card
+        lanes = [f"lane{i + 1}" for i in range(args.readers)]
+        cards_by_lane = {}
+        for lane in lanes:
+            cards_by_lane[lane] = [f"LT-{lane}-{j:04d}" for j in range(args.cards_per_reader)]
+            for card in cards_by_lane[lane]:
+                r = await client.post("/admin/cards", json={"card_id": card, "is_guest": rng.random() < 0.7})
+                if r.status_code not in (201, 409):
+                    r.raise_for_status()
+
+        # workers split the lanes round-robin (one worker -> all lanes)
+        worker_lanes = [lanes[i::args.workers] for i in range(args.workers)]
+
+        metrics = Metrics()
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        db0 = (os.path.getsize(db_path) / 1e6) if db_path and os.path.exists(db_path) else 0.0
+        start = time.monotonic()
+        stop_at = start + args.duration
+        tasks = [asyncio.create_task(esp32_reader(client, metrics, lane, cards_by_lane[lane], args, stop_at,
+                                                  random.Random(rng.random())))
+                 for lane in lanes]
+        tasks += [asyncio.create_task(ai_worker(client, metrics, wl, args, stop_at, random.Random(rng.random())))
+                  for wl in worker_lanes]
+
+        if args.report_every > 0:
+            while time.monotonic() < stop_at and not all(t.done() for t in tasks):
+                await asyncio.sleep(min(args.report_every, max(0.0, stop_at - time.monotonic())))
+                if time.monotonic() < stop_at:
+                    print_report(metrics, time.monotonic() - start, lock, db_path, rss0, db0, final=False)
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+        print_report(metrics, elapsed, lock, db_path, rss0, db0, final=True)
+
+    total = metrics.total_requests()
+    error_rate = metrics.errors / total if total else 0.0
+    if error_rate > args.max_error_rate:
+        print(f"FAIL: error rate {error_rate:.4f} > {args.max_error_rate}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Load / soak test with simulated ESP32 readers and AI workers")
+    ap.add_argument("--readers", type=int, default=4, help="simulated ESP32 card readers (one lane each)")
+    ap.add_argument("--workers", type=int, default=1, help="simulated AI workers")
+    ap.add_argument("--duration", type=float, default=30, help="seconds")
+    ap.add_argument("--cards-per-reader", type=int, default=50)
+    ap.add_argument("--event-interval", type=float, default=2.0, help="mean seconds between card taps per reader")
+    ap.add_argument("--barrier-poll", type=float, default=0.5, help="ESP32 /barrier-command poll interval")
+    ap.add_argument("--task-poll", type=float, default=0.2, help="worker idle poll interval")
+    ap.add_argument("--infer-ms", type=float, default=150, help="simulated burst + inference time")
+    ap.add_argument("--report-every", type=float, default=0, help="print progress every N seconds (soak)")
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--url", default=None, help="load a running server instead of the in-process app")
+    ap.add_argument("--secret", default=os.getenv("SECRET_KEY", "my-very-strong-secret"), help="with --url")
+    ap.add_argument("--max-error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=1)
+    sys.exit(asyncio.run(run(ap.parse_args())))
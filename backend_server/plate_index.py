@@ -0,0 +1,155 @@
+# backend_server/plate_index.py
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_plate_key(plate_text: Optional[str]) -> str:
+    """Canonical key for a plate: uppercase A-Z/0-9 only (drops spaces, dashes, dots)."""
+    if not plate_text:
+        return ""
+    return _NON_ALNUM.sub("", plate_text.upper())
+
+
+def bounded_edit_distance(a: str, b: str, max_dist: int) -> int:
+    """Levenshtein distance, giving up early once it exceeds max_dist (returns max_dist + 1)."""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < row_min:
+                row_min = cur[j]
+        if row_min > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1] if prev[-1] <= max_dist else max_dist + 1
+
+
+def deletion_variants(key: str, max_dist: int) -> set:
+    """key itself plus every string obtained by deleting up to max_dist characters."""
+    out, frontier = {key}, {key}
+    for _ in range(max_dist):
+        nxt = set()
+        for v in frontier:
+            for i in range(len(v)):
+                nxt.add(v[:i] + v[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+class PlateIndex:
+    """
+    In-memory index of CHECKED_IN sessions keyed by normalized plate.
+      - exact lookup: dict
+      - fuzzy lookup (OCR near-misses): deletion-neighbourhood index (SymSpell style).
+        Two plates within edit distance k always share a variant with <= k deletions,
+        so a lookup is a handful of hash probes + verification of the few candidates.
+    """
+
+    ACTIVE_STATUS = "CHECKED_IN"
+
+    def __init__(self, max_dist: int = 1):
+        self.max_dist = max_dist
+        self._lock = threading.Lock()
+        self._by_plate = {}      # plate key -> set(session_id)
+        self._by_session = {}    # session_id -> (plate key, card_id)
+        self._variants = {}      # deletion variant -> set(plate key)
+
+    # ---- Sync with SQLite ----
+    def load(self, db_path: str) -> int:
+        with sqlite3.connect(db_path) as con:
+            rows = con.execute(
+                "SELECT session_id, plate_text, card_id FROM sessions WHERE status=?",
+                (self.ACTIVE_STATUS,)
+            ).fetchall()
+        with self._lock:
+            self._by_plate.clear()
+            self._by_session.clear()
+            self._variants.clear()
+            for session_id, plate_text, card_id in rows:
+                self._add_locked(session_id, plate_text, card_id)
+        return len(rows)
+
+    def add(self, session_id: str, plate_text: Optional[str], card_id: Optional[str] = None) -> None:
+        with self._lock:
+            self._discard_locked(session_id)
+            self._add_locked(session_id, plate_text, card_id)
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._discard_locked(session_id)
+
+    def __len__(self) -> int:
+        return len(self._by_session)
+
+    # ---- Queries ----
+    def lookup(self, plate_text: Optional[str], max_dist: Optional[int] = None):
+        """
+        -> list dict {session_id, card_id, plate_key, distance}, closest first.
+        max_dist may not exceed the index's own max_dist.
+        """
+        key = normalize_plate_key(plate_text)
+        if not key:
+            return []
+        max_dist = self.max_dist if max_dist is None else min(max_dist, self.max_dist)
+        with self._lock:
+            candidates = set()
+            for v in deletion_variants(key, max_dist):
+                candidates |= self._variants.get(v, set())
+            hits = []
+            for plate_key in candidates:
+                dist = bounded_edit_distance(key, plate_key, max_dist)
+                if dist > max_dist:
+                    continue
+                for session_id in self._by_plate[plate_key]:
+                    hits.append({
+                        "session_id": session_id,
+                        "card_id": self._by_session[session_id][1],
+                        "plate_key": plate_key,
+                        "distance": dist,
+                    })
+        hits.sort(key=lambda h: h["distance"])
+        return hits
+
+    # ---- Internals (caller holds self._lock) ----
+    def _add_locked(self, session_id, plate_text, card_id):
+        key = normalize_plate_key(plate_text)
+        self._by_session[session_id] = (key, card_id)
+        if not key:
+            return
+        sessions = self._by_plate.get(key)
+        if sessions is None:
+            self._by_plate[key] = {session_id}
+            for v in deletion_variants(key, self.max_dist):
+                self._variants.setdefault(v, set()).add(key)
+        else:
+            sessions.add(session_id)
+
+    def _discard_locked(self, session_id):
+        entry = self._by_session.pop(session_id, None)
+        if not entry or not entry[0]:
+            return
+        key = entry[0]
+        sessions = self._by_plate.get(key)
+        if sessions is None:
+            return
+        sessions.discard(session_id)
+        if sessions:
+            return
+        del self._by_plate[key]
+        for v in deletion_variants(key, self.max_dist):
+            keys = self._variants.get(v)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._variants[v]
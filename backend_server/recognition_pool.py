@@ -0,0 +1,173 @@
+# backend_server/recognition_pool.py
+import os
+import sys
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# ---- Worker-process side ----
+_pipeline = None
+
+def _init_worker(nice: int):
+    """Runs once per pool process: lower priority, then load the models (via main_app)."""
+    global _pipeline
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)  # manual captures must not starve the camera worker
+        except OSError:
+            pass
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except Exception:
+        pass
+    os.chdir(PROJECT_ROOT)  # model paths in main_app are relative to the project root
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    import main_app
+    main_app.load_models()
+    _pipeline = main_app
+
+def _warm_up() -> int:
+    """No-op task: forces a pool process to start and run _init_worker (model load) ahead of time."""
+    return os.getpid()
+
+def _recognize_jpeg(data: bytes) -> dict:
+    import cv2
+    import numpy as np
+    # np.frombuffer wraps the received bytes without copying; imdecode reads straight from it
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Cannot decode image.")
+    candidate = _pipeline.recognize_frame(frame)
+    if candidate is None:
+        return {"plate_text": "", "plate_conf": None, "plate_bbox": None, "num_chars": 0}
+    meta = candidate["meta"]
+    return {
+        "plate_text": candidate["text"],
+        "plate_conf": meta.get("plate_conf"),
+        "plate_bbox": meta.get("bbox"),
+        "num_chars": meta.get("num_chars"),
+    }
+
+
+# ---- Backend side ----
+class PoolBusy(Exception):
+    pass
+
+
+class PoolUnavailable(Exception):
+    """The worker processes died (initializer failure, OOM, crash); the pool restarts on next use."""
+
+
+class RecognitionPool:
+    """
+    Bounded process pool for manual (staff) image recognition.
+      - at most max_pending tasks queued/running, beyond that submit() raises PoolBusy
+      - task status kept in memory, finished tasks evicted after ttl_seconds
+      - a broken pool (a worker process died) is dropped and rebuilt on the next submit
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 4, ttl_seconds: float = 300.0, nice: int = 5):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.ttl_seconds = float(ttl_seconds)
+        self.nice = int(nice)
+        self._executor = None
+        self._tasks = {}  # task_id -> dict(status, created, finished, result/error, session_id)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._broken = False
+
+    def start(self):
+        if self._executor is not None and self._broken:
+            self.shutdown()
+        if self._executor is None:
+            self._broken = False
+            ctx = multiprocessing.get_context("spawn")  # no fork of the running event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=ctx,
+                initializer=_init_worker, initargs=(self.nice,)
+            )
+
+    def warm_up(self):
+        """Start the pool and every worker process now, so the first upload doesn't pay for torch + YOLO."""
+        self.start()
+        for _ in range(self.workers):
+            self._executor.submit(_warm_up).add_done_callback(self._on_warm_up)
+
+    def _on_warm_up(self, future):
+        try:
+            future.result()
+        except BrokenProcessPool as e:
+            self._broken = True
+            print(f"[RecognitionPool] Worker failed to start: {e}")
+        except Exception as e:
+            print(f"[RecognitionPool] Warm-up failed: {e}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, data: bytes, session_id=None) -> str:
+        self.start()
+        self._evict_expired()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolBusy()
+            self._pending += 1
+            task_id = str(uuid.uuid4())
+            self._tasks[task_id] = {"status": "pending", "created": time.time(),
+                                    "finished": None, "session_id": session_id}
+        try:
+            future = self._executor.submit(_recognize_jpeg, data)
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+                self._tasks.pop(task_id, None)
+            if isinstance(e, BrokenProcessPool):
+                self._broken = True  # start() rebuilds it on the next submit
+                raise PoolUnavailable(str(e)) from e
+            raise
+        future.add_done_callback(lambda f, tid=task_id: self._on_done(tid, f))
+        return task_id
+
+    def status(self, task_id: str):
+        self._evict_expired()
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def _on_done(self, task_id, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._broken = True
+        with self._lock:
+            self._pending -= 1
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task["finished"] = time.time()
+            try:
+                task.update(future.result())
+                task["status"] = "done"
+            except CancelledError:
+                # shutdown(cancel_futures=True) while queued; str(e) would be empty
+                task["status"] = "error"
+                task["error"] = "cancelled (recognition pool shut down)"
+            except Exception as e:
+                task["status"] = "error"
+                task["error"] = str(e)
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [tid for tid, t in self._tasks.items() if (t["finished"] or t["created"]) < cutoff
+                       and t["status"] != "pending"]
+            for tid in expired:
+                del self._tasks[tid]
@@ -0,0 +1,259 @@
+# backend_server/tariff.py
+"""
+Tariff engine.
+
+A tariff is a set of plans keyed by "<vehicle_type>:<guest|registered>" (falling back to
+"default:<...>" then "default"). Each plan has time-of-day bands (price per hour, local time),
+a daily cap (per calendar day), a minimum fee and a grace period.
+
+Plans are compiled into a cumulative per-minute table over one day, so a fee is:
+    same day : min(cum[m_out] - cum[m_in], cap)
+    otherwise: min(cum[1440] - cum[m_in], cap) + full_days * min(cum[1440], cap) + min(cum[m_out], cap)
+i.e. O(1) regardless of how long the vehicle stayed.
+
+Bulk mode (`python tariff.py recompute`) reprices historical sessions, hot DB and monthly
+archives, with NumPy over the time_in/time_out columns, then rebuilds the revenue aggregates.
+"""
+import os
+import json
+import math
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+MINUTES_PER_DAY = 1440
+_UTC_OFFSET_RE = re.compile(r"(?:Z|([+-])(\d{2}):?(\d{2}))$")
+
+DEFAULT_TARIFF = {
+    "tz_offset_hours": 7,   # bands are expressed in local (Vietnam) time; DB stores UTC
+    "round_to": 1000,       # round fees up to the nearest 1000 VND
+    "plans": {
+        "bicycle:guest":      {"bands": [{"start": "06:00", "end": "18:00", "per_hour": 500},
+                                         {"start": "18:00", "end": "06:00", "per_hour": 1000}],
+                               "daily_cap": 5000, "min_fee": 1000, "grace_minutes": 10},
+        "motorbike:guest":    {"bands": [{"start": "06:00", "end": "18:00", "per_hour": 1000},
+                                         {"start": "18:00", "end": "06:00", "per_hour": 2000}],
+                               "daily_cap": 10000, "min_fee": 3000, "grace_minutes": 10},
+        "car:guest":          {"bands": [{"start": "06:00", "end": "18:00", "per_hour": 10000},
+                                         {"start": "18:00", "end": "06:00", "per_hour": 15000}],
+                               "daily_cap": 120000, "min_fee": 20000, "grace_minutes": 10},
+        "default:registered": {"bands": [{"start": "00:00", "end": "00:00", "per_hour": 0}],
+                               "daily_cap": 0, "min_fee": 0, "grace_minutes": 0},
+        "default:guest":      {"bands": [{"start": "06:00", "end": "18:00", "per_hour": 1000},
+                                         {"start": "18:00", "end": "06:00", "per_hour": 2000}],
+                               "daily_cap": 10000, "min_fee": 3000, "grace_minutes": 10},
+    },
+}
+
+
+def _parse_hhmm(s: str) -> int:
+    h, m = s.split(":")
+    return (int(h) * 60 + int(m)) % MINUTES_PER_DAY
+
+
+class CompiledPlan:
+    __slots__ = ("name", "cum", "day_total", "cap", "min_fee", "grace", "_np_cum")
+
+    def __init__(self, name: str, plan: dict):
+        self.name = name
+        per_minute = [0.0] * MINUTES_PER_DAY
+        for band in plan.get("bands", []):
+            start, end = _parse_hhmm(band["start"]), _parse_hhmm(band["end"])
+            rate = float(band.get("per_hour", 0.0)) / 60.0
+            length = (end - start) % MINUTES_PER_DAY or MINUTES_PER_DAY  # start == end -> whole day
+            for k in range(length):
+                per_minute[(start + k) % MINUTES_PER_DAY] = rate
+        cum = [0.0] * (MINUTES_PER_DAY + 1)
+        for m in range(MINUTES_PER_DAY):
+            cum[m + 1] = cum[m] + per_minute[m]
+        self.cum = cum
+        self.day_total = cum[MINUTES_PER_DAY]
+        cap = plan.get("daily_cap")
+        self.cap = float(cap) if cap else math.inf
+        self.min_fee = float(plan.get("min_fee", 0.0))
+        self.grace = int(plan.get("grace_minutes", 0))
+        self._np_cum = None
+
+    def raw_fee(self, start_min: int, end_min: int) -> float:
+        """start/end are absolute local minutes (minutes since epoch in the tariff's tz)."""
+        if end_min - start_min <= self.grace:
+            return 0.0
+        d_in, m_in = divmod(start_min, MINUTES_PER_DAY)
+        d_out, m_out = divmod(end_min, MINUTES_PER_DAY)
+        cum, cap = self.cum, self.cap
+        if d_in == d_out:
+            fee = min(cum[m_out] - cum[m_in], cap)
+        else:
+            fee = (min(self.day_total - cum[m_in], cap)
+                   + (d_out - d_in - 1) * min(self.day_total, cap)
+                   + min(cum[m_out], cap))
+        return max(fee, self.min_fee)
+
+    def np_cum(self):
+        if self._np_cum is None:
+            import numpy as np
+            self._np_cum = np.asarray(self.cum, dtype=np.float64)
+        return self._np_cum
+
+
+class TariffEngine:
+    def __init__(self, tariff: Optional[dict] = None):
+        tariff = tariff or DEFAULT_TARIFF
+        self.tz = timezone(timedelta(hours=float(tariff.get("tz_offset_hours", 0))))
+        self.tz_offset_min = int(round(float(tariff.get("tz_offset_hours", 0)) * 60))
+        self.round_to = float(tariff.get("round_to", 0) or 0)
+        self.plans = {name: CompiledPlan(name, p) for name, p in tariff.get("plans", {}).items()}
+        if not self.plans:
+            raise ValueError("Tariff has no plans.")
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv("TARIFF_PATH")
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        return cls()
+
+    def plan_for(self, vehicle_type: Optional[str], is_guest: bool) -> CompiledPlan:
+        kind = "guest" if is_guest else "registered"
+        vt = (vehicle_type or "default").strip().lower()
+        for key in (f"{vt}:{kind}", f"default:{kind}", "default"):
+            plan = self.plans.get(key)
+            if plan is not None:
+                return plan
+        return next(iter(self.plans.values()))
+
+    def _local_minute(self, iso_ts: str) -> int:
+        dt = datetime.fromisoformat(iso_ts)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() // 60) + self.tz_offset_min
+
+    def _round(self, fee: float) -> float:
+        if self.round_to > 0:
+            return math.ceil(fee / self.round_to - 1e-9) * self.round_to
+        return round(fee, 2)
+
+    def compute_fee(self, vehicle_type: Optional[str], is_guest: bool, time_in: str, time_out: str) -> float:
+        plan = self.plan_for(vehicle_type, is_guest)
+        fee = plan.raw_fee(self._local_minute(time_in), self._local_minute(time_out))
+        return self._round(fee)
+
+    # ---- Bulk (vectorized) ----
+    def compute_fees_bulk(self, vehicle_types, is_guest, times_in, times_out):
+        """Vectorized fees for many sessions. Inputs are equal-length sequences; returns np.ndarray."""
+        import numpy as np
+        start = self._iso_to_local_minutes(times_in)
+        end = self._iso_to_local_minutes(times_out)
+        plan_names = np.array([self.plan_for(vt, bool(g)).name for vt, g in zip(vehicle_types, is_guest)])
+        fees = np.zeros(len(start), dtype=np.float64)
+        for name in np.unique(plan_names):
+            mask = plan_names == name
+            plan = self.plans[name]
+            fees[mask] = self._raw_fees_np(plan, start[mask], end[mask])
+        if self.round_to > 0:
+            fees = np.ceil(fees / self.round_to - 1e-9) * self.round_to
+        else:
+            fees = np.round(fees, 2)
+        return fees
+
+    def _iso_to_local_minutes(self, values):
+        import numpy as np
+        # numpy only parses the naive part, so the UTC offset is applied separately
+        # (same rule as _local_minute: naive timestamps are UTC)
+        naive, offsets = [], []
+        for v in values:
+            m = _UTC_OFFSET_RE.search(v) if v else None
+            if m is None:
+                naive.append(v[:19] if v else "NaT")
+                offsets.append(0)
+                continue
+            naive.append(v[:m.start()][:19])
+            offsets.append(0 if m.group(1) is None else
+                           (1 if m.group(1) == "+" else -1) * (int(m.group(2)) * 60 + int(m.group(3))))
+        minutes = np.array(naive, dtype="datetime64[m]").astype(np.int64)
+        return minutes - np.array(offsets, dtype=np.int64) + self.tz_offset_min
+
+    @staticmethod
+    def _raw_fees_np(plan: CompiledPlan, start, end):
+        import numpy as np
+        cum = plan.np_cum()
+        d_in, m_in = np.divmod(start, MINUTES_PER_DAY)
+        d_out, m_out = np.divmod(end, MINUTES_PER_DAY)
+        cap = plan.cap
+        same_day = np.minimum(cum[m_out] - cum[m_in], cap)
+        multi_day = (np.minimum(plan.day_total - cum[m_in], cap)
+                     + (d_out - d_in - 1) * min(plan.day_total, cap)
+                     + np.minimum(cum[m_out], cap))
+        fees = np.where(d_in == d_out, same_day, multi_day)
+        fees = np.maximum(fees, plan.min_fee)
+        return np.where(end - start <= plan.grace, 0.0, fees)
+
+
+def _reprice(con, prefix: str, engine: "TariffEngine", only_missing: bool, batch_size: int) -> int:
+    where = "s.status='CHECKED_OUT' AND s.time_out IS NOT NULL"
+    if only_missing:
+        where += " AND s.fee IS NULL"
+    updated = 0
+    cur = con.execute(
+        f"SELECT s.session_id, s.vehicle_type, c.is_guest, s.time_in, s.time_out "
+        f"FROM {prefix}sessions s LEFT JOIN main.cards c ON c.card_id = s.card_id WHERE {where}"
+    )
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        ids, vts, guests, tin, tout = zip(*rows)
+        fees = engine.compute_fees_bulk(vts, [g if g is not None else True for g in guests], tin, tout)
+        con.executemany(f"UPDATE {prefix}sessions SET fee=? WHERE session_id=?",
+                        zip(fees.tolist(), ids))
+        updated += len(rows)
+    return updated
+
+
+def recompute_fees(db_path: str, engine: TariffEngine, only_missing: bool = False,
+                   archive_dir: Optional[str] = None, batch_size: int = 50000) -> int:
+    """
+    Reprice CHECKED_OUT sessions in batches, in the hot DB and (if archive_dir is given) every
+    monthly archive, then rebuild the revenue aggregates. Returns number of rows updated.
+    """
+    import aggregates
+    import archiver
+
+    with sqlite3.connect(db_path) as con:
+        updated = _reprice(con, "main.", engine, only_missing, batch_size)
+    for _, path in archiver.archive_files(archive_dir, newest_first=False) if archive_dir else []:
+        with sqlite3.connect(db_path) as con:
+            con.execute("ATTACH DATABASE ? AS arc", (path,))
+            try:
+                updated += _reprice(con, "arc.", engine, only_missing, batch_size)
+                con.commit()
+            finally:
+                con.execute("DETACH DATABASE arc")
+    aggregates.rebuild(db_path, archive_dir)
+    return updated
+
+
+if __name__ == "__main__":
+    import argparse
+    data_dir = os.path.join(os.path.dirname(__file__), "data")
+    ap = argparse.ArgumentParser(description="Parking tariff tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rc = sub.add_parser("recompute", help="Reprice historical (CHECKED_OUT) sessions")
+    rc.add_argument("--db", default=os.path.join(data_dir, "parking.db"))
+    rc.add_argument("--archive-dir", default=os.path.join(data_dir, "archive"))
+    rc.add_argument("--only-missing", action="store_true", help="Only sessions with fee IS NULL")
+    q = sub.add_parser("quote", help="Quote a single fee")
+    q.add_argument("time_in")
+    q.add_argument("time_out")
+    q.add_argument("--vehicle-type", default=None)
+    q.add_argument("--registered", action="store_true")
+    args = ap.parse_args()
+
+    engine = TariffEngine.from_env()
+    if args.cmd == "recompute":
+        n = recompute_fees(args.db, engine, only_missing=args.only_missing, archive_dir=args.archive_dir)
+        print(f"Repriced {n} sessions.")
+    else:
+        print(engine.compute_fee(args.vehicle_type, not args.registered, args.time_in, args.time_out))
@@ -0,0 +1,111 @@
+# bench_detector_input.py
+# Đo độ trễ và recall của plate detector theo imgsz (có prescale 1 lần) so với đưa thẳng frame full-res.
+#   python bench_detector_input.py --images data/val/images --labels data/val/labels --sizes 416,480,640,960
+# Nhãn theo định dạng YOLO: <class> <cx> <cy> <w> <h> (chuẩn hoá 0..1), cùng tên file với ảnh.
+import os
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from detector_input import Prescaler, box_to_full
+
+
+def iou_xyxy(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    area_a = max(0, a[2] - a[0]) * max(0, a[3] - a[1])
+    area_b = max(0, b[2] - b[0]) * max(0, b[3] - b[1])
+    return inter / (area_a + area_b - inter + 1e-9)
+
+
+def load_labels(path, W, H):
+    boxes = []
+    if not os.path.exists(path):
+        return boxes
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cx, cy, w, h = (float(v) for v in parts[1:5])
+            boxes.append(((cx - w / 2) * W, (cy - h / 2) * H, (cx + w / 2) * W, (cy + h / 2) * H))
+    return boxes
+
+
+def count_matches(gt, preds, iou_thres):
+    used, hit = set(), 0
+    for g in gt:
+        best, best_j = 0.0, None
+        for j, p in enumerate(preds):
+            if j in used:
+                continue
+            v = iou_xyxy(g, p)
+            if v > best:
+                best, best_j = v, j
+        if best_j is not None and best >= iou_thres:
+            used.add(best_j)
+            hit += 1
+    return hit
+
+
+def run(model, samples, imgsz, conf, iou_thres, prescale):
+    pre = Prescaler(imgsz) if prescale else None
+    lat, hits, total = [], 0, 0
+    for frame, gt in samples:
+        t0 = time.perf_counter()
+        if pre is not None:
+            img, scale = pre(frame)
+            res = model(img, imgsz=imgsz, conf=conf, verbose=False)[0]
+            preds = [box_to_full(b, scale, frame.shape) for b in res.boxes.xyxy.tolist()]
+        else:
+            res = model(frame, imgsz=imgsz, conf=conf, verbose=False)[0]
+            preds = [tuple(b) for b in res.boxes.xyxy.tolist()]
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        hits += count_matches(gt, preds, iou_thres)
+        total += len(gt)
+    lat = np.array(lat[1:] if len(lat) > 1 else lat)  # bỏ lần đầu (warm-up)
+    return float(lat.mean()), float(np.percentile(lat, 95)), hits / max(total, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", required=True)
+    ap.add_argument("--labels", default=None, help="mặc định: ../labels cạnh thư mục images")
+    ap.add_argument("--model", default="models/plate_detector.pt")
+    ap.add_argument("--sizes", default="320,416,480,640,960")
+    ap.add_argument("--conf", type=float, default=0.25)
+    ap.add_argument("--iou", type=float, default=0.5)
+    ap.add_argument("--limit", type=int, default=200)
+    args = ap.parse_args()
+
+    labels_dir = args.labels or os.path.join(os.path.dirname(os.path.abspath(args.images)), "labels")
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(args.images, ext)))
+    samples = []
+    for p in paths[:args.limit]:
+        frame = cv2.imread(p)
+        if frame is None:
+            continue
+        H, W = frame.shape[:2]
+        stem = os.path.splitext(os.path.basename(p))[0]
+        samples.append((frame, load_labels(os.path.join(labels_dir, stem + ".txt"), W, H)))
+    if not samples:
+        print("No images found.")
+        return
+
+    model = YOLO(args.model)
+    print(f"{len(samples)} images, conf={args.conf}, IoU>={args.iou}")
+    print(f"{'mode':<10}{'imgsz':>6}{'mean ms':>10}{'p95 ms':>10}{'recall':>9}")
+    for imgsz in (int(s) for s in args.sizes.split(",")):
+        for prescale in (False, True):
+            mean_ms, p95_ms, recall = run(model, samples, imgsz, args.conf, args.iou, prescale)
+            mode = "prescale" if prescale else "native"
+            print(f"{mode:<10}{imgsz:>6}{mean_ms:>10.1f}{p95_ms:>10.1f}{recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
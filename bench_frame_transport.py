@@ -0,0 +1,121 @@
+# bench_frame_transport.py
+# So sánh chuyển frame giữa 2 process: multiprocessing.Queue (pickle cả frame) vs FrameRing (shared memory).
+#   python bench_frame_transport.py --width 1920 --height 1080 --frames 600
+import argparse
+import queue
+import resource
+import time
+import multiprocessing as mp
+
+import numpy as np
+
+from frame_ring import FrameRing
+
+
+def _touch(frame):
+    # giả lập consumer đọc frame (không copy): lấy mẫu thưa để chắc chắn dữ liệu được chạm tới
+    return int(frame[::64, ::64, 0].sum())
+
+
+def _maxrss_mb():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return self_kb / 1024.0, child_kb / 1024.0
+
+
+# ---- Queue + pickle ----
+def _queue_producer(q, n, shape):
+    frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+    for i in range(n):
+        frame[0, 0, 0] = i % 255
+        q.put(frame)  # pickle + copy qua pipe
+    q.put(None)
+
+
+def bench_queue(n, shape, ctx):
+    q = ctx.Queue(maxsize=4)
+    p = ctx.Process(target=_queue_producer, args=(q, n, shape))
+    t0 = time.perf_counter()
+    p.start()
+    got = 0
+    while True:
+        frame = q.get()
+        if frame is None:
+            break
+        _touch(frame)
+        got += 1
+    dt = time.perf_counter() - t0
+    p.join()
+    return got, dt
+
+
+# ---- Shared-memory ring ----
+def _ring_producer(spec, n, done):
+    ring = FrameRing.attach(spec)
+    src = np.random.randint(0, 255, ring.shape, dtype=np.uint8)
+    written = 0
+    while written < n:
+        slot, view = ring.acquire()
+        if slot is None:
+            continue
+        np.copyto(view, src)  # tương đương decode thẳng vào slot: 1 lần ghi
+        view[0, 0, 0] = written % 255
+        ring.publish(slot)
+        written += 1
+    done.set()
+    ring.close()
+
+
+def bench_ring(n, shape, ctx, slots):
+    ring = FrameRing.create(*shape, n_slots=slots, ctx=ctx)
+    done = ctx.Event()
+    p = ctx.Process(target=_ring_producer, args=(ring.spec, n, done))
+    t0 = time.perf_counter()
+    p.start()
+    got = 0
+    while True:
+        try:
+            slot, _, view = ring.get(timeout=0.5)
+        except queue.Empty:
+            if done.is_set():
+                break
+            continue
+        _touch(view)
+        ring.release(slot)
+        got += 1
+    dt = time.perf_counter() - t0
+    p.join()
+    ring.close()
+    return got, dt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--slots", type=int, default=4)
+    ap.add_argument("--mode", choices=["both", "queue", "ring"], default="both")
+    args = ap.parse_args()
+
+    shape = (args.height, args.width, 3)
+    ctx = mp.get_context("spawn")
+    mb = np.prod(shape) / 1e6
+    print(f"Frame {args.width}x{args.height} ({mb:.1f} MB), {args.frames} frames")
+
+    # chạy mỗi chế độ 1 lần/tiến trình để ru_maxrss không lẫn nhau khi so sánh bộ nhớ
+    if args.mode in ("both", "queue"):
+        got, dt = bench_queue(args.frames, shape, ctx)
+        self_mb, child_mb = _maxrss_mb()
+        print(f"[queue] {got/dt:8.1f} frames/s  {got*mb/dt:8.1f} MB/s  maxrss main={self_mb:.0f}MB child={child_mb:.0f}MB")
+    if args.mode in ("both", "ring"):
+        got, dt = bench_ring(args.frames, shape, ctx, args.slots)
+        self_mb, child_mb = _maxrss_mb()
+        print(f"[ring ] {got/dt:8.1f} frames/s  {got*mb/dt:8.1f} MB/s  maxrss main={self_mb:.0f}MB child={child_mb:.0f}MB"
+              f"  (shm {args.slots * mb:.0f}MB)")
+    if args.mode == "both":
+        print("Note: maxrss is cumulative; run --mode queue / --mode ring separately for clean memory numbers.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# detector_input.py
+# Tiền xử lý đầu vào detector: thu nhỏ frame full-res MỘT lần về imgsz của detector (letterbox,
+# pad phải/dưới tới bội số stride) rồi map bbox ngược lại toạ độ full-res. Crop biển lấy từ
+# frame gốc nên vẫn giữ nguyên chất lượng cho char recognizer.
+import os
+import json
+import threading
+
+import cv2
+import numpy as np
+
+STRIDE = 32
+PAD_VALUE = 114  # giống Ultralytics LetterBox
+
+# Profile theo camera: imgsz của detector và char model, deadline suy luận (giây).
+#   imgsz nhỏ -> nhanh hơn nhưng biển ở xa dễ bị sót (xem bench_detector_input.py)
+#   deadline: frame chờ scheduler quá lâu thì bỏ; thiếu -> INFER_DEADLINE chung của worker
+DEFAULT_PROFILES = {
+    "default":  {"det_imgsz": 640, "char_imgsz": 320},
+    "hd_far":   {"det_imgsz": 960, "char_imgsz": 320},   # camera full-HD đặt xa cổng
+    "near":     {"det_imgsz": 480, "char_imgsz": 256},   # camera sát barrier, biển to
+    "lowpower": {"det_imgsz": 416, "char_imgsz": 224, "deadline": 3.0},   # máy cổng yếu: suy luận chậm hơn
+}
+
+
+def load_camera_profile(name=None):
+    """Profile từ CAMERA_PROFILES_PATH (JSON, ghi đè/bổ sung) hoặc DEFAULT_PROFILES."""
+    profiles = dict(DEFAULT_PROFILES)
+    path = os.getenv("CAMERA_PROFILES_PATH")
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            profiles.update(json.load(f))
+    name = name or os.getenv("CAMERA_PROFILE", "default")
+    profile = dict(profiles.get(name, profiles["default"]))
+    profile["name"] = name if name in profiles else "default"
+    return profile
+
+
+def _ceil_stride(x):
+    return int(np.ceil(x / STRIDE) * STRIDE)
+
+
+class Prescaler:
+    """
+    prescale(frame) -> (img, scale): img có cạnh dài = imgsz (không phóng to), pad phải/dưới
+    tới bội số 32 -> Ultralytics không phải resize lại. Canvas cấp phát sẵn theo từng thread.
+    """
+
+    def __init__(self, imgsz):
+        self.imgsz = int(imgsz)
+        self._local = threading.local()
+
+    def _canvas(self, h, w, c, slot):
+        canvases = getattr(self._local, "canvases", None)
+        if canvases is None:
+            canvases = self._local.canvases = {}
+        canvas = canvases.get(slot)
+        if canvas is None or canvas.shape != (h, w, c):
+            canvas = np.full((h, w, c), PAD_VALUE, dtype=np.uint8)
+            canvases[slot] = canvas
+        return canvas
+
+    def __call__(self, frame, slot=0):
+        """slot: chỉ số canvas (batch nhiều frame cùng lúc thì mỗi frame 1 slot)."""
+        h, w = frame.shape[:2]
+        scale = min(self.imgsz / float(max(h, w)), 1.0)
+        nh, nw = max(1, int(round(h * scale))), max(1, int(round(w * scale)))
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        canvas = self._canvas(_ceil_stride(nh), _ceil_stride(nw), c, slot)
+        if scale < 1.0:
+            cv2.resize(frame, (nw, nh), dst=canvas[:nh, :nw], interpolation=cv2.INTER_AREA)
+        else:
+            canvas[:nh, :nw] = frame.reshape(nh, nw, c)
+        canvas[nh:, :] = PAD_VALUE
+        canvas[:nh, nw:] = PAD_VALUE
+        return canvas, scale
+
+
+def box_to_full(xyxy, scale, frame_shape):
+    """bbox trên ảnh đã thu nhỏ -> toạ độ int trên frame gốc (đã kẹp trong biên)."""
+    H, W = frame_shape[:2]
+    x1, y1, x2, y2 = (float(v) / scale for v in xyxy)
+    return (max(0, min(int(x1), W - 1)), max(0, min(int(y1), H - 1)),
+            max(0, min(int(round(x2)), W)), max(0, min(int(round(y2)), H)))
@@ -0,0 +1,98 @@
+# evidence_writer.py
+# Lưu bằng chứng (frame tốt nhất + crop biển) cho từng phiên, ngoài đường nóng:
+#   - task chỉ đẩy (session_id, frame, bbox) vào hàng đợi rồi đi tiếp, barrier không phải chờ
+#   - 1 thread nền encode WebP/JPEG (chất lượng cấu hình được) và POST lên backend /evidence/{session_id}
+#   - hàng đợi đầy thì bỏ bằng chứng mới (ghi log) thay vì làm chậm nhận dạng
+import os
+import queue
+import threading
+
+import cv2
+import httpx
+
+EVIDENCE_FORMAT = os.getenv("EVIDENCE_FORMAT", "webp").lower()          # webp | jpeg
+EVIDENCE_QUALITY = int(os.getenv("EVIDENCE_QUALITY", "70"))             # 1..100
+EVIDENCE_MAX_WIDTH = int(os.getenv("EVIDENCE_MAX_WIDTH", "1280"))       # frame lớn hơn thì thu nhỏ (crop giữ nguyên)
+EVIDENCE_QUEUE = int(os.getenv("EVIDENCE_QUEUE", "16"))
+CROP_PAD = 0.15  # nới crop biển mỗi phía (tỉ lệ theo kích thước bbox)
+
+
+def encode_image(img, fmt=EVIDENCE_FORMAT, quality=EVIDENCE_QUALITY):
+    """-> (bytes, mime) hoặc None. WebP không có trong bản OpenCV này thì dùng JPEG."""
+    if fmt == "webp":
+        ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if ok:
+            return buf.tobytes(), "image/webp"
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return (buf.tobytes(), "image/jpeg") if ok else None
+
+
+def crop_plate(frame, bbox, pad=CROP_PAD):
+    H, W = frame.shape[:2]
+    x1, y1, x2, y2 = bbox
+    px, py = int((x2 - x1) * pad), int((y2 - y1) * pad)
+    x1, y1 = max(0, x1 - px), max(0, y1 - py)
+    x2, y2 = min(W, x2 + px), min(H, y2 + py)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return frame[y1:y2, x1:x2]
+
+
+class EvidenceWriter:
+    def __init__(self, backend_url, secret, timeout=10.0, max_queue=EVIDENCE_QUEUE):
+        self._client = httpx.Client(base_url=backend_url, headers={"X-Secret": secret}, timeout=timeout)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, session_id, frame, bbox=None):
+        """Không block: frame phải là mảng riêng (không bị grabber ghi đè)."""
+        try:
+            self._queue.put_nowait((session_id, frame, bbox))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"[evidence] Queue full, dropping snapshot for session {session_id}")
+            return False
+
+    def stop(self, timeout=5.0):
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        self._client.close()
+
+    def _encode(self, frame, bbox):
+        files = {}
+        if bbox:
+            crop = crop_plate(frame, bbox)
+            if crop is not None:
+                enc = encode_image(crop)
+                if enc:
+                    files["crop"] = ("crop", enc[0], enc[1])
+        h, w = frame.shape[:2]
+        if w > EVIDENCE_MAX_WIDTH:
+            frame = cv2.resize(frame, (EVIDENCE_MAX_WIDTH, int(h * EVIDENCE_MAX_WIDTH / w)), interpolation=cv2.INTER_AREA)
+        enc = encode_image(frame)
+        if enc:
+            files["frame"] = ("frame", enc[0], enc[1])
+        return files
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            session_id, frame, bbox = item
+            try:
+                files = self._encode(frame, bbox)
+                if not files:
+                    continue
+                r = self._client.post(f"/evidence/{session_id}", files=files)
+                r.raise_for_status()
+                self.written += 1
+            except Exception as e:
+                print(f"[evidence] Could not store snapshot for session {session_id}: {e}")
@@ -0,0 +1,70 @@
+# frame_quality.py
+# Chấm điểm chất lượng frame thật rẻ (trên ảnh xám thu nhỏ) để chỉ gửi frame tốt nhất vào YOLO:
+#   - độ nét: phương sai Laplacian
+#   - phơi sáng: độ sáng trung bình lệch khỏi giữa + tỉ lệ pixel cháy/bết
+#   - chuyển động: chênh lệch với frame trước trong vùng biển số (ROI)
+import cv2
+import numpy as np
+
+SCORE_WIDTH = 320  # tính điểm trên ảnh rộng 320px: ~1ms/frame
+
+
+def _roi_gray(frame, roi=None, width=SCORE_WIDTH):
+    if roi is not None:
+        H, W = frame.shape[:2]
+        x1, y1, x2, y2 = roi
+        # nới ROI 50% mỗi phía: biển có thể xê dịch giữa các xe
+        pw, ph = (x2 - x1) // 2, (y2 - y1) // 2
+        x1, y1 = max(0, x1 - pw), max(0, y1 - ph)
+        x2, y2 = min(W, x2 + pw), min(H, y2 + ph)
+        if x2 - x1 >= 8 and y2 - y1 >= 8:
+            frame = frame[y1:y2, x1:x2]
+    h, w = frame.shape[:2]
+    if w > width:
+        frame = cv2.resize(frame, (width, max(1, int(h * width / w))), interpolation=cv2.INTER_AREA)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+
+def sharpness(gray):
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def exposure(gray):
+    """1.0 = phơi sáng tốt; về 0 khi quá tối/quá sáng hoặc nhiều pixel bị cháy."""
+    mean = float(gray.mean())
+    clipped = float(np.count_nonzero((gray < 8) | (gray > 247))) / gray.size
+    return max(0.0, 1.0 - abs(mean - 128.0) / 128.0 - 2.0 * clipped)
+
+
+def motion(gray, prev_gray):
+    if prev_gray is None or prev_gray.shape != gray.shape:
+        return 0.0
+    return float(cv2.absdiff(gray, prev_gray).mean()) / 255.0
+
+
+def score_frames(frames, roi=None, motion_weight=8.0):
+    """
+    frames: list frame BGR (cùng kích thước) theo thứ tự thời gian.
+    -> list dict {index, score, sharpness, exposure, motion}
+    motion của 1 frame = max(chênh lệch với frame trước, với frame sau): frame đầu/cuối cũng bị
+    phạt chuyển động như các frame giữa, không được ưu tiên chỉ vì thiếu hàng xóm.
+    """
+    grays = [_roi_gray(frame, roi) for frame in frames]
+    diffs = [motion(grays[i], grays[i - 1]) for i in range(1, len(grays))]  # diffs[i-1]: giữa i-1 và i
+    out = []
+    for i, gray in enumerate(grays):
+        s, e = sharpness(gray), exposure(gray)
+        m = max(diffs[i - 1] if i > 0 else 0.0, diffs[i] if i < len(diffs) else 0.0)
+        score = np.log1p(s) * e * max(0.0, 1.0 - motion_weight * m)
+        out.append({"index": i, "score": float(score), "sharpness": s, "exposure": e, "motion": m})
+    return out
+
+
+def select_top_frames(frames, k, roi=None):
+    """-> list (frame, quality) của k frame tốt nhất, tốt nhất trước."""
+    if not frames:
+        return []
+    scored = sorted(score_frames(frames, roi), key=lambda q: q["score"], reverse=True)
+    return [(frames[q["index"]], q) for q in scored[:max(1, k)]]
@@ -0,0 +1,237 @@
+# frame_ring.py
+# Vòng frame dùng shared memory: capture process ghi frame 1 lần vào slot cấp phát sẵn,
+# process suy luận đọc trực tiếp qua NumPy view (không pickle, không copy).
+# Chỉ số slot đi qua 2 queue nhỏ: free (slot trống) và ready (slot có frame mới).
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    n_slots frame (H, W, C) uint8 trong 1 khối SharedMemory.
+      - writer: acquire() -> (slot, view) ; ghi vào view ; publish(slot, ts)
+      - reader: get() -> (slot, ts, view) ; dùng view ; release(slot)
+    Khi hết slot trống, writer lấy lại slot cũ nhất đang chờ trong ready (bỏ frame cũ),
+    nên reader luôn thấy frame gần đây nhất, không bị dồn frame cũ.
+    """
+
+    def __init__(self, spec, shm, create):
+        self.spec = spec
+        self._shm = shm
+        self._owner = create
+        n, h, w, c = spec["n_slots"], spec["height"], spec["width"], spec["channels"]
+        self.frames = np.ndarray((n, h, w, c), dtype=np.uint8, buffer=shm.buf)
+        self.free_q = spec["free_q"]
+        self.ready_q = spec["ready_q"]
+        self.dropped = 0
+
+    @classmethod
+    def create(cls, height, width, channels=3, n_slots=4, ctx=None):
+        ctx = ctx or mp.get_context()
+        size = int(n_slots * height * width * channels)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        spec = {
+            "name": shm.name, "n_slots": int(n_slots),
+            "height": int(height), "width": int(width), "channels": int(channels),
+            "free_q": ctx.Queue(), "ready_q": ctx.Queue(),
+        }
+        for i in range(n_slots):
+            spec["free_q"].put(i)
+        return cls(spec, shm, create=True)
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec, shared_memory.SharedMemory(name=spec["name"]), create=False)
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    # ---- writer ----
+    def acquire(self):
+        """-> (slot, view) để ghi frame, hoặc (None, None) nếu mọi slot đang bị reader giữ."""
+        try:
+            slot = self.free_q.get_nowait()
+        except queue.Empty:
+            try:
+                slot, _ = self.ready_q.get_nowait()  # bỏ frame cũ nhất chưa ai đọc
+            except queue.Empty:
+                self.dropped += 1
+                return None, None
+            self.dropped += 1
+        return slot, self.frames[slot]
+
+    def publish(self, slot, ts=None):
+        self.ready_q.put((slot, time.time() if ts is None else ts))
+
+    def write(self, frame, ts=None) -> bool:
+        """Copy 1 frame đã có vào ring (dùng khi không decode thẳng được vào slot)."""
+        slot, view = self.acquire()
+        if slot is None:
+            return False
+        if frame.shape != view.shape:
+            import cv2
+            cv2.resize(frame, (view.shape[1], view.shape[0]), dst=view)
+        else:
+            np.copyto(view, frame)
+        self.publish(slot, ts)
+        return True
+
+    # ---- reader ----
+    def get(self, timeout=None):
+        """-> (slot, ts, view) ; view chỉ hợp lệ tới khi release(slot)."""
+        slot, ts = self.ready_q.get(timeout=timeout)
+        return slot, ts, self.frames[slot]
+
+    def get_latest(self, timeout=None):
+        """Như get() nhưng bỏ qua mọi frame cũ hơn frame mới nhất đang chờ."""
+        slot, ts, view = self.get(timeout=timeout)
+        while True:
+            try:
+                nslot, nts = self.ready_q.get_nowait()
+            except queue.Empty:
+                return slot, ts, view
+            self.release(slot)
+            slot, ts, view = nslot, nts, self.frames[nslot]
+
+    def release(self, slot):
+        self.free_q.put(slot)
+
+    def close(self):
+        self.frames = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def capture_to_ring(source, spec, stop_event):
+    """Target cho capture process: decode thẳng vào slot của ring (cap.read(image=view))."""
+    import cv2
+    from stream_supervisor import open_video_capture
+    ring = FrameRing.attach(spec)
+    cap = open_video_capture(source)  # có timeout mở/đọc: URL chết không treo process con
+    try:
+        while not stop_event.is_set():
+            slot, view = ring.acquire()
+            if slot is None:
+                # mọi slot đang được xử lý -> vẫn phải đọc để stream không bị trễ
+                cap.grab()
+                continue
+            ok, frame = cap.read(image=view)
+            if not ok or frame is None:
+                ring.release(slot)
+                time.sleep(0.05)
+                continue
+            if frame.ctypes.data != view.ctypes.data:
+                # OpenCV cấp phát lại (khác kích thước) -> copy/resize vào slot
+                if frame.shape != view.shape:
+                    cv2.resize(frame, (view.shape[1], view.shape[0]), dst=view)
+                else:
+                    np.copyto(view, frame)
+            ring.publish(slot)
+    finally:
+        cap.release()
+        ring.close()
+
+
+def probe_frame_shape(source):
+    """Đọc thử 1 frame để biết (H, W, C) của stream (có timeout, như mọi capture khác)."""
+    from stream_supervisor import open_video_capture
+    cap = open_video_capture(source)
+    try:
+        ok, frame = cap.read()
+        return frame.shape if ok and frame is not None else None
+    finally:
+        cap.release()
+
+
+class RingCapture:
+    """
+    Thay thế cv2.VideoCapture phía consumer: read() trả về view trong shared memory.
+    Frame trả về trước được release khi gọi read() lần sau (hoặc release()).
+    """
+
+    def __init__(self, source, n_slots=4, ctx=None):
+        shape = probe_frame_shape(source)
+        self._ok = shape is not None
+        self.ring = None
+        self._proc = None
+        self._held = None
+        if not self._ok:
+            return
+        h, w = shape[:2]
+        c = shape[2] if len(shape) == 3 else 1
+        # spawn: process gọi đã có torch, thread scheduler/supervisor, event loop -> fork có thể
+        # deadlock trong OpenCV/FFmpeg. Main module phải import an toàn (model tải trong load_models()).
+        ctx = ctx or mp.get_context("spawn")
+        self.ring = FrameRing.create(h, w, c, n_slots=n_slots, ctx=ctx)
+        self._stop = ctx.Event()
+        self._proc = ctx.Process(target=capture_to_ring, args=(source, self.ring.spec, self._stop), daemon=True)
+        self._proc.start()
+
+    def isOpened(self):
+        return self._ok and self._proc is not None and self._proc.is_alive()
+
+    def read(self, timeout=2.0, latest=True):
+        if self._held is not None:
+            self.ring.release(self._held)
+            self._held = None
+        if not self.isOpened():
+            return False, None
+        try:
+            if latest:
+                slot, _, view = self.ring.get_latest(timeout=timeout)
+            else:
+                slot, _, view = self.ring.get(timeout=timeout)
+        except queue.Empty:
+            return False, None
+        self._held = slot
+        return True, view
+
+    def read_leased(self, timeout=2.0, latest=True):
+        """
+        -> (ok, view, slot): như read() nhưng slot KHÔNG tự trả lại ở lần đọc sau; view hợp lệ tới khi
+        caller gọi release_slot(slot). Dùng khi frame cũ còn phải đọc được trong lúc chờ frame mới.
+        """
+        if not self.isOpened():
+            return False, None, None
+        try:
+            if latest:
+                slot, _, view = self.ring.get_latest(timeout=timeout)
+            else:
+                slot, _, view = self.ring.get(timeout=timeout)
+        except queue.Empty:
+            return False, None, None
+        return True, view, slot
+
+    def release_slot(self, slot):
+        if self.ring is not None:
+            self.ring.release(slot)
+
+    def get(self, prop_id):
+        import cv2
+        if self.ring is None:
+            return 0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.ring.shape[1]
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.ring.shape[0]
+        return 0
+
+    def release(self):
+        if self._proc is not None:
+            self._stop.set()
+            self._proc.join(timeout=3)
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._proc = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -116,6 +116,11 @@ function StaffView() {
             }
             break
           }
+          if (st.status === 'error') {
+            done = true
+            pushNotification('Lỗi nhận dạng ảnh trên máy chủ', 'error')
+            break
+          }
         } catch {
           // continue polling quietly
         }
@@ -55,10 +55,16 @@ export const api = {
     http('POST', '/check-in', { body: { card_id: cardId, lane, plate_text: plateText, vehicle_type: vehicleType } }),
   checkOut: ({ cardId }) => http('POST', '/check-out', { body: { card_id: cardId } }),
 
+  // Card + registered user info (memberInfo)
+  getCard: (cardId) => http('GET', `/cards/${encodeURIComponent(cardId)}`),
+
   // Plate updates (temporary manual fallback – requires sessionId)
   updatePlate: ({ sessionId, plateText, vehicleType }) =>
     http('POST', '/update-plate', { body: { session_id: sessionId, plate_text: plateText, vehicle_type: vehicleType } }),
 
+  // Per-lane camera stream health (fps, reconnects, last frame age)
+  getCameraHealth: () => http('GET', '/camera-health'),
+
   // Ask backend to start capture task
   captureTask: () => http('GET', '/capture-task'),
 
@@ -0,0 +1,137 @@
+# inference_scheduler.py
+# Bộ lập lịch suy luận dùng chung cho nhiều camera trong 1 worker:
+#   - mỗi camera có hàng đợi riêng; 1 thread duy nhất gọi model (YOLO không thread-safe)
+#   - gom batch xuyên camera (cùng key = cùng imgsz), lấy xoay vòng giữa các camera -> công bằng
+#   - mỗi request có deadline; quá hạn thì bỏ (future trả None) thay vì làm trễ các lane khác
+import time
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import Future
+
+
+class _Request:
+    __slots__ = ("camera", "key", "frame", "deadline", "future")
+
+    def __init__(self, camera, key, frame, deadline):
+        self.camera = camera
+        self.key = key
+        self.frame = frame
+        self.deadline = deadline
+        self.future = Future()
+
+
+class BatchScheduler:
+    """
+    run_batch(key, frames) -> list kết quả (cùng thứ tự frames), chạy trên thread của scheduler.
+    submit(camera, key, frame, deadline_s) -> concurrent.futures.Future
+    """
+
+    def __init__(self, run_batch, max_batch=4, max_wait=0.01):
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = float(max_wait)  # chờ thêm tối đa bấy nhiêu giây để gom đủ batch
+        self._queues = {}                # camera -> deque[_Request]
+        self._order = []                 # thứ tự xoay vòng camera
+        self._rr = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self.stats = defaultdict(lambda: {"served": 0, "expired": 0})
+        self.batches = 0
+        self.batched_frames = 0
+        self._thread = threading.Thread(target=self._loop, name="inference-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+    def submit(self, camera, key, frame, deadline_s):
+        req = _Request(camera, key, frame, time.monotonic() + deadline_s)
+        with self._cond:
+            if camera not in self._queues:
+                self._queues[camera] = deque()
+                self._order.append(camera)
+            self._queues[camera].append(req)
+            self._cond.notify()
+        return req.future
+
+    def snapshot(self):
+        # stats bị thread scheduler thêm key / cộng dồn -> chỉ đọc khi giữ lock
+        with self._cond:
+            pending = {cam: len(q) for cam, q in self._queues.items()}
+            per_camera = {cam: dict(st) for cam, st in self.stats.items()}
+            batches, batched_frames = self.batches, self.batched_frames
+        avg = batched_frames / batches if batches else 0.0
+        return {"pending": pending, "per_camera": per_camera,
+                "batches": batches, "avg_batch": round(avg, 2)}
+
+    # ---- internals (gọi khi đang giữ self._cond) ----
+    def _drop_expired(self, now):
+        for cam, q in self._queues.items():
+            while q and q[0].deadline < now:
+                req = q.popleft()
+                self.stats[cam]["expired"] += 1
+                req.future.set_result(None)
+
+    def _heads(self):
+        return [q[0] for q in self._queues.values() if q]
+
+    def _take_batch(self):
+        heads = self._heads()
+        if not heads:
+            return None, []
+        key = min(heads, key=lambda r: r.deadline).key  # key của request gấp nhất
+        batch = []
+        n = len(self._order)
+        # xoay vòng: mỗi lượt lấy tối đa 1 request/camera -> camera đông không chiếm hết batch
+        while len(batch) < self.max_batch:
+            took = False
+            for i in range(n):
+                cam = self._order[(self._rr + i) % n]
+                q = self._queues[cam]
+                if q and q[0].key == key and len(batch) < self.max_batch:
+                    batch.append(q.popleft())
+                    took = True
+            if not took:
+                break
+        self._rr = (self._rr + 1) % max(n, 1)
+        return key, batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._stop and not self._heads():
+                    self._cond.wait()
+                if self._stop:
+                    for q in self._queues.values():
+                        while q:
+                            q.popleft().future.set_result(None)
+                    return
+                # gom thêm chút nếu chưa đủ batch và request gấp nhất còn dư thời gian
+                pending = sum(len(q) for q in self._queues.values())
+                if pending < self.max_batch and self.max_wait > 0:
+                    slack = min(r.deadline for r in self._heads()) - time.monotonic()
+                    if slack > 2 * self.max_wait:
+                        self._cond.wait(self.max_wait)
+                self._drop_expired(time.monotonic())
+                key, batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                results = self.run_batch(key, [r.frame for r in batch])
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            with self._cond:
+                self.batches += 1
+                self.batched_frames += len(batch)
+                for r in batch:
+                    self.stats[r.camera]["served"] += 1
+            for r, res in zip(batch, results):
+                r.future.set_result(res)
@@ -1,28 +1,66 @@
 # main_app.py (AI Worker) — phiên bản có Burst Voting
-import cv2
 from ultralytics import YOLO
 import numpy as np
-import requests
+import httpx  # cần gói httpx (thay cho requests): client async cho event loop
+import asyncio
 import time
 import os
 from collections import Counter
+from frame_quality import select_top_frames
+from detector_input import Prescaler, box_to_full, load_camera_profile
+from inference_scheduler import BatchScheduler
+from evidence_writer import EvidenceWriter
+from plate_grammar import decode_plate, STRICT as PLATE_GRAMMAR_STRICT
+from stream_supervisor import StreamSupervisor, open_video_capture
 
 # ---- Cấu hình ----
 BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 SECRET_KEY = os.getenv("SECRET_KEY", "my-very-strong-secret")
 CAMERA_STREAM_URL = os.getenv("CAMERA_STREAM_URL", "http://192.168.1.3:8080/video")
 POLL_INTERVAL_SECONDS = float(os.getenv("POLL_INTERVAL_SECONDS", "2"))
+# direct: đọc camera ngay trong process này | shm: capture process riêng ghi vào FrameRing
+FRAME_TRANSPORT = os.getenv("FRAME_TRANSPORT", "direct").lower()
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "4"))
 
 # Burst voting
-BURST_FRAMES = int(os.getenv("BURST_FRAMES", "6"))       # số frame cho 1 nhiệm vụ
-BURST_SLEEP  = float(os.getenv("BURST_SLEEP", "0.03"))   # delay giữa frame burst (giây)
+BURST_FRAMES = int(os.getenv("BURST_FRAMES", "10"))       # số frame gom + chấm điểm cho 1 nhiệm vụ
+BURST_WINDOW = float(os.getenv("BURST_WINDOW", "0.4"))   # thời gian tối đa gom frame (giây)
+BURST_TOP_K  = int(os.getenv("BURST_TOP_K", "3"))        # chỉ k frame nét nhất mới chạy YOLO
+
+# Async pipeline
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", "3"))  # số burst chạy song song (xe nối đuôi / nhiều lane)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+SAVE_EVIDENCE = os.getenv("SAVE_EVIDENCE", "1") == "1"  # lưu frame + crop biển của từng phiên (evidence_writer.py)
+HEALTH_REPORT_SECONDS = float(os.getenv("HEALTH_REPORT_SECONDS", "10"))  # chu kỳ báo sức khoẻ camera
+
+# Nhiều camera trong 1 worker: CAMERA_STREAMS="lane1=http://...|near,lane2=rtsp://..." ("|profile" tuỳ chọn).
+# Không đặt -> 1 camera CAMERA_STREAM_URL nhận việc của mọi lane.
+CAMERA_STREAMS = os.getenv("CAMERA_STREAMS", "").strip()
+
+# Scheduler suy luận dùng chung (1 bản model cho mọi camera)
+INFER_MAX_BATCH = int(os.getenv("INFER_MAX_BATCH", "4"))       # số frame tối đa / batch (xuyên camera)
+INFER_MAX_WAIT = float(os.getenv("INFER_MAX_WAIT", "0.01"))    # chờ gom batch tối đa (giây)
+INFER_DEADLINE = float(os.getenv("INFER_DEADLINE", "1.5"))     # frame chờ quá lâu thì bỏ (giây); profile "deadline" ghi đè
+
+# Profile camera mặc định: imgsz detector / char model (CAMERA_PROFILE, CAMERA_PROFILES_PATH)
+CAMERA_PROFILE = load_camera_profile()
+DET_IMGSZ = int(CAMERA_PROFILE["det_imgsz"])
+CHAR_IMGSZ = int(CAMERA_PROFILE["char_imgsz"])
 
 # ---- Tải các mô hình ----
-print("Loading models...")
-plate_detector = YOLO('models/plate_detector.pt')
-char_recognizer = YOLO('models/char_recognizer.pt')
-CHAR_CLASS_NAMES = char_recognizer.model.names
-print("Models loaded.")
+# Không tải lúc import: process con spawn (capture shm, pool nhận dạng ở backend) import lại file này
+plate_detector = char_recognizer = None
+CHAR_CLASS_NAMES = None
+
+def load_models():
+    global plate_detector, char_recognizer, CHAR_CLASS_NAMES
+    if plate_detector is not None:
+        return
+    print("Loading models...")
+    plate_detector = YOLO('models/plate_detector.pt')
+    char_recognizer = YOLO('models/char_recognizer.pt')
+    CHAR_CLASS_NAMES = char_recognizer.model.names
+    print("Models loaded.")
 
 # ---- Tham số định dạng/tiền xử lý chuỗi ----
 LINE_SEPARATION_THRESHOLD_FACTOR = 0.7
@@ -71,11 +109,11 @@ def pick_best_plate_box(plate_results):
         return None
     return max(plate_results.boxes, key=lambda box: float(box.conf))
 
-def score_candidate(text: str, char_count: int, plate_conf: float) -> float:
-    """Điểm gộp đơn giản để tie-break (ưu tiên có nhiều ký tự hợp lệ + conf bbox)."""
-    # điểm = (độ dài sau loại space) + 0.2*plate_conf
+def score_candidate(text: str, char_count: int, plate_conf: float, char_prob: float = 0.0) -> float:
+    """Điểm gộp đơn giản để tie-break (ưu tiên có nhiều ký tự hợp lệ + conf bbox + xác suất ký tự)."""
+    # điểm = (độ dài sau loại space) + 0.2*plate_conf + 0.5*xác suất ký tự thấp nhất (theo ngữ pháp)
     core_len = len(text.replace(" ", ""))
-    return core_len + 0.2 * float(plate_conf or 0.0)
+    return core_len + 0.2 * float(plate_conf or 0.0) + 0.5 * float(char_prob or 0.0)
 
 def majority_vote_text(candidates):
     """
@@ -109,80 +147,244 @@ def majority_vote_text(candidates):
         best = max(ties, key=lambda s: len(s.replace(" ","")))
     return best
 
-# ---- Hàm thực thi nhiệm vụ (có Burst Voting) ----
-def process_capture_task(session_id, cap):
-    print(f"Processing task for session_id: {session_id}")
-
-    frame_candidates = []  # lưu ứng viên theo từng frame: dict{text, score, meta}
-
-    for i in range(BURST_FRAMES):
-        ret, frame = cap.read()
-        if not ret:
-            print("Warn: Could not read frame from camera (burst).")
-            time.sleep(BURST_SLEEP)
-            continue
-
-        # 1) Phát hiện biển số
-        plate_results = plate_detector(frame, verbose=False)[0]
-        best_box = pick_best_plate_box(plate_results)
+# ---- Nhận dạng theo batch (dùng chung cho mọi camera, burst và ảnh upload) ----
+_prescalers = {}
+
+def _prescaler(imgsz):
+    pre = _prescalers.get(imgsz)
+    if pre is None:
+        pre = _prescalers[imgsz] = Prescaler(imgsz)
+    return pre
+
+def extract_char_detections(char_results, min_conf=0.15):
+    """-> list [x1, y1, x2, y2, char, conf]; giữ cả box conf thấp để ngữ pháp cân nhắc."""
+    char_detections = []
+    if char_results and char_results.boxes is not None and char_results.boxes.data is not None:
+        for char in char_results.boxes.data.tolist():
+            cx1, cy1, cx2, cy2, c_score, c_class_id = char
+            if c_score < min_conf:
+                continue
+            char_name = CHAR_CLASS_NAMES[int(c_class_id)]
+            char_detections.append([cx1, cy1, cx2, cy2, char_name, c_score])
+    return char_detections
+
+def read_plate_text(char_detections):
+    """
+    -> (text, info): giải mã theo ngữ pháp biển VN (chọn chuỗi hợp lệ có xác suất cao nhất).
+    Không hợp lệ: chế độ strict trả "" (loại luôn), ngược lại ghép như cũ (ký tự conf >= 0.5).
+    """
+    decoded = decode_plate(char_detections)
+    if decoded is not None:
+        return decoded["text"], {"grammar": decoded["pattern"], "char_prob": round(decoded["min_prob"], 3),
+                                 "confident": decoded["confident"]}
+    if PLATE_GRAMMAR_STRICT:
+        return "", {"grammar": "invalid", "char_prob": 0.0, "confident": False}
+    strong = [d[:5] for d in char_detections if d[5] >= 0.5]
+    return normalize_plate(format_plate_text(strong)), {"grammar": None, "char_prob": 0.0, "confident": False}
+
+def recognize_batch(frames, det_imgsz=None, char_imgsz=None):
+    """
+    Chạy detector + char recognizer trên nhiều frame BGR, mỗi model gọi 1 lần cho cả batch.
+    -> list (cùng thứ tự frames) dict {text, score, meta} hoặc None nếu không thấy biển.
+    """
+    det_imgsz = det_imgsz or DET_IMGSZ
+    char_imgsz = char_imgsz or CHAR_IMGSZ
+    if not frames:
+        return []
+
+    # 1) Phát hiện biển số trên ảnh đã thu nhỏ 1 lần, bbox map lại toạ độ full-res
+    pre = _prescaler(det_imgsz)
+    det_imgs, scales = [], []
+    for i, frame in enumerate(frames):
+        img, scale = pre(frame, slot=i)
+        det_imgs.append(img)
+        scales.append(scale)
+    plate_results = plate_detector(det_imgs, imgsz=det_imgsz, verbose=False)
+
+    crops, owners, metas = [], [], {}
+    for i, (frame, res, scale) in enumerate(zip(frames, plate_results, scales)):
+        best_box = pick_best_plate_box(res)
         if best_box is None:
-            time.sleep(BURST_SLEEP)
             continue
-
-        x1, y1, x2, y2 = map(int, best_box.xyxy[0])
-        plate_conf = float(best_box.conf)
-        plate_crop = frame[y1:y2, x1:x2]
+        x1, y1, x2, y2 = box_to_full(best_box.xyxy[0].tolist(), scale, frame.shape)
+        plate_crop = frame[y1:y2, x1:x2]  # crop từ frame gốc -> giữ nguyên chất lượng
         if plate_crop.size == 0:
-            time.sleep(BURST_SLEEP)
             continue
-
-        # 2) Nhận dạng ký tự (dùng ngưỡng như bản cũ: 0.5)
-        char_results = char_recognizer(plate_crop, verbose=False)[0]
-        char_detections = []
-        if char_results and char_results.boxes is not None and char_results.boxes.data is not None:
-            for char in char_results.boxes.data.tolist():
-                cx1, cy1, cx2, cy2, c_score, c_class_id = char
-                if c_score < 0.5:
-                    continue
-                char_name = CHAR_CLASS_NAMES[int(c_class_id)]
-                char_detections.append([cx1, cy1, cx2, cy2, char_name])
-
-        # 3) Ghép chuỗi + chuẩn hóa
-        raw_text = format_plate_text(char_detections)
-        plate_text = normalize_plate(raw_text)
-
-        # 4) Tính điểm + lưu ứng viên
-        sc = score_candidate(plate_text, len(char_detections), plate_conf)
-        frame_candidates.append({
+        crops.append(plate_crop)
+        owners.append(i)
+        metas[i] = {"bbox": [x1, y1, x2, y2], "plate_conf": float(best_box.conf)}
+
+    # 2) Nhận dạng ký tự cho mọi crop trong 1 lần gọi
+    out = [None] * len(frames)
+    if not crops:
+        return out
+    char_results = char_recognizer(crops, imgsz=char_imgsz, verbose=False)
+    for i, cr in zip(owners, char_results):
+        char_detections = extract_char_detections(cr)
+
+        # 3) Giải mã theo ngữ pháp biển số (loại cách đọc không thể có)
+        plate_text, info = read_plate_text(char_detections)
+
+        # 4) Tính điểm
+        meta = metas[i]
+        meta.update(info)
+        meta["num_chars"] = len(char_detections)
+        out[i] = {
             "text": plate_text,
-            "score": sc,
-            "meta": {
-                "bbox": [x1, y1, x2, y2],
-                "plate_conf": plate_conf,
-                "num_chars": len(char_detections)
-            }
-        })
+            "score": score_candidate(plate_text, len(char_detections), meta["plate_conf"], info["char_prob"]),
+            "meta": meta,
+        }
+    return out
+
+def recognize_frame(frame):
+    """1 frame với profile mặc định (dùng cho ảnh upload)."""
+    return recognize_batch([frame])[0]
+
+# ---- Grabber: đọc camera liên tục ở thread riêng (tự reconnect), luôn giữ frame mới nhất ----
+class FrameGrabber(StreamSupervisor):
+    """StreamSupervisor (đọc liên tục + tự reconnect) kèm API async cho event loop."""
+
+    async def next_frame(self, after_seq, timeout=1.0, not_before=None):
+        """Chờ (không block event loop) tới khi có frame mới hơn after_seq (và không cũ hơn not_before)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.seq > after_seq:
+                seq, frame = self.latest(not_before)  # chỉ copy (shm) khi thật sự có frame mới
+                if frame is not None:
+                    return seq, frame
+            if time.monotonic() >= deadline:
+                return after_seq, None
+            await asyncio.sleep(0.005)
+
+    async def collect(self, max_frames, window):
+        """
+        Gom tối đa max_frames frame mới (khác nhau) trong window giây, không chạy model.
+        Chỉ nhận frame chụp từ lúc gọi trở đi: frame cũ (trước khi camera mất) có thể là xe trước.
+        """
+        started = time.monotonic()
+        if not self.is_live():
+            return []
+        frames = []
+        seq = self.seq - 1
+        deadline = started + window
+        while len(frames) < max_frames:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            seq, frame = await self.next_frame(seq, timeout=remaining, not_before=started)
+            if frame is None:
+                break
+            frames.append(frame)
+        return frames
+
+
+# ---- Camera: stream + grabber + profile riêng, model dùng chung ----
+class Camera:
+    def __init__(self, lane, url, profile_name=None):
+        self.lane = lane
+        self.url = url
+        self.profile = load_camera_profile(profile_name)
+        self.key = (int(self.profile["det_imgsz"]), int(self.profile["char_imgsz"]))  # key gom batch
+        self.deadline = float(self.profile.get("deadline", INFER_DEADLINE))          # hạn chờ suy luận / frame
+        self.grabber = None
+        # bbox biển gần nhất: làm ROI cho điểm chuyển động (camera cổng cố định -> biển thường ở chỗ cũ)
+        self.last_plate_bbox = None
+
+    def _open_capture(self):
+        if FRAME_TRANSPORT == "shm":
+            from frame_ring import RingCapture
+            return RingCapture(self.url, n_slots=FRAME_RING_SLOTS)
+        return open_video_capture(self.url)
+
+    def open(self):
+        """Bắt đầu đọc stream; mất kết nối thì grabber tự mở lại (model không bị tải lại)."""
+        self.grabber = FrameGrabber(self._open_capture, name=f"lane {self.lane or '-'}").start()
+        return self
+
+    def health(self):
+        return {"lane": self.lane, **self.grabber.health()}
+
+    def close(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+
+def parse_camera_streams(spec):
+    """'lane1=url|profile,lane2=url' -> list Camera; rỗng -> 1 camera mặc định (lane None)."""
+    if not spec:
+        return [Camera(None, CAMERA_STREAM_URL)]
+    cameras = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        lane, _, rest = item.partition("=")
+        url, _, profile = rest.partition("|")
+        cameras.append(Camera(lane.strip(), url.strip(), profile.strip() or None))
+    return cameras
+
+# ---- Chọn kết quả cuối từ các ứng viên burst ----
+def choose_final(frame_candidates):
+    """-> (final_text, best_candidate)"""
+    final_text = majority_vote_text(frame_candidates)
+    # Lấy ứng viên có cùng text và score cao nhất (meta + frame làm bằng chứng)
+    same_text = [c for c in frame_candidates if c["text"] == final_text]
+    if same_text:
+        best = max(same_text, key=lambda c: c["score"])
+    else:
+        best = max(frame_candidates, key=lambda c: c["score"])  # fallback
+    return final_text, best
+
 
-        time.sleep(BURST_SLEEP)
+# ---- Hàm thực thi nhiệm vụ (có Burst Voting) ----
+async def process_capture_task(session_id, camera, client, scheduler, evidence=None, exit_lane=False):
+    """exit_lane: đọc biển lúc xe ra -> gửi /exit-plate (backend so với biển lúc vào), không ghi phiên."""
+    print(f"Processing {'exit ' if exit_lane else ''}task for session_id: {session_id} (lane {camera.lane or '-'})")
+    loop = asyncio.get_running_loop()
+
+    frame_candidates = []  # lưu ứng viên theo từng frame: dict{text, score, meta, frame}
+
+    # Gom frame trước (rẻ), chấm điểm nét/phơi sáng/chuyển động, chỉ top-k đi vào YOLO
+    frames = await camera.grabber.collect(BURST_FRAMES, BURST_WINDOW)
+    if not frames:
+        print("Warn: Could not read frame from camera (burst).")
+    top = await loop.run_in_executor(None, select_top_frames, frames, BURST_TOP_K, camera.last_plate_bbox)
+
+    # Frame tốt nhất đi trước: ngữ pháp đọc chắc chắn -> xong luôn; chưa thì gửi phần còn lại 1 lượt
+    # (scheduler gom batch cùng camera khác)
+    for chunk in (top[:1], top[1:]):
+        if not chunk:
+            break
+        futures = [scheduler.submit(camera.lane, camera.key, frame, camera.deadline) for frame, _ in chunk]
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        for (frame, quality), candidate in zip(chunk, results):
+            if candidate is None:
+                continue
+            candidate["meta"]["quality"] = round(quality["score"], 3)
+            candidate["frame"] = frame
+            frame_candidates.append(candidate)
+            camera.last_plate_bbox = candidate["meta"]["bbox"]
+        texts = [c["text"] for c in frame_candidates if c["text"]]
+        if any(c["text"] and c["meta"].get("confident") for c in frame_candidates):
+            break
+        if len(texts) >= 2 and Counter(texts).most_common(1)[0][1] >= 2:
+            break
 
     # 5) Bỏ phiếu chọn kết quả cuối
+    final_text, best = choose_final(frame_candidates) if frame_candidates else ("", None)
+    if exit_lane:
+        # luôn trả lời (kể cả rỗng) để check-out không phải chờ hết timeout
+        await send_exit_plate(client, session_id, final_text)
+        return
     if not frame_candidates:
         print("No candidates collected in burst.")
         return
-
-    final_text = majority_vote_text(frame_candidates)
-    # Lấy meta của ứng viên có cùng text và score cao nhất
-    same_text = [c for c in frame_candidates if c["text"] == final_text]
-    if same_text:
-        best_meta = max(same_text, key=lambda c: c["score"])["meta"]
-    else:
-        best_meta = max(frame_candidates, key=lambda c: c["score"])["meta"]  # fallback
+    best_meta = best["meta"]
 
     if final_text:
         print(f"[BURST] Final plate: {final_text} (from {len(frame_candidates)} frames) -> sending...")
         try:
-            response = requests.post(
-                f"{BACKEND_URL}/update-plate",
+            response = await client.post(
+                "/update-plate",
                 json={
                     "session_id": session_id,
                     "plate_text": final_text,
@@ -192,48 +394,130 @@ def process_capture_task(session_id, cap):
                     "plate_bbox": best_meta.get("bbox", None),
                     "num_chars": best_meta.get("num_chars", None)
                 },
-                headers={"X-Secret": SECRET_KEY},
-                timeout=5
             )
             response.raise_for_status()
             print(f"Successfully updated plate for session {session_id}.")
-        except requests.exceptions.RequestException as e:
+            # bằng chứng: encode + upload ở thread nền, không giữ task lại
+            if evidence is not None:
+                evidence.submit(session_id, best["frame"], best_meta.get("bbox"))
+        except httpx.HTTPError as e:
             print(f"Error sending plate data to backend: {e}")
     else:
         print("[BURST] Could not read any characters from the detected plates.")
 
-# ---- Vòng lặp chính của Worker ----
-def main_loop():
+
+async def send_exit_plate(client, session_id, plate_text):
+    print(f"[EXIT] Plate read: {plate_text or '-'} -> sending for verification...")
+    try:
+        response = await client.post("/exit-plate", json={"session_id": session_id, "plate_text": plate_text})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Error sending exit plate to backend: {e}")
+
+
+# ---- Vòng lặp chính của Worker (asyncio) ----
+async def _run_task(sem, session_id, camera, client, scheduler, evidence, exit_lane=False):
+    try:
+        await process_capture_task(session_id, camera, client, scheduler, evidence, exit_lane)
+    except Exception as e:
+        print(f"Task {session_id} failed: {e}")
+    finally:
+        sem.release()
+
+async def report_health(client, cameras, scheduler):
+    """Định kỳ gửi sức khoẻ từng camera (FPS, số lần reconnect, tuổi frame cuối) về backend."""
+    while True:
+        await asyncio.sleep(HEALTH_REPORT_SECONDS)
+        try:
+            await client.post("/camera-health", json={
+                "cameras": [cam.health() for cam in cameras],
+                "scheduler": scheduler.snapshot(),
+            })
+        except Exception as e:  # lỗi bất kỳ không được dừng hẳn việc báo sức khoẻ
+            print(f"Could not report camera health: {e}")
+
+async def main_async():
     print("AI Worker started. Connecting to camera...")
-    cap = cv2.VideoCapture(CAMERA_STREAM_URL)
-    if not cap.isOpened():
-        print("FATAL: Cannot open camera stream. Exiting.")
-        return
+    cameras = [cam.open() for cam in parse_camera_streams(CAMERA_STREAMS)]
+    # chờ frame đầu một chút để log trạng thái; camera chưa lên vẫn được grabber thử lại nền
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not all(cam.grabber.is_live() for cam in cameras):
+        await asyncio.sleep(0.1)
+    for cam in cameras:
+        state = "streaming" if cam.grabber.is_live() else "waiting for stream"
+        print(f"Camera lane={cam.lane or '-'} {state} ({cam.profile['name']}: imgsz {cam.key[0]}/{cam.key[1]}, "
+              f"deadline {cam.deadline:g}s).")
+    by_lane = {cam.lane: cam for cam in cameras}
+    default_cam = cameras[0]
+    # chỉ nhận task của các lane có camera (khi cấu hình nhiều camera)
+    task_params = {"lanes": ",".join(cam.lane for cam in cameras)} if CAMERA_STREAMS else None
+
+    scheduler = BatchScheduler(
+        lambda key, frames: recognize_batch(frames, key[0], key[1]),
+        max_batch=INFER_MAX_BATCH, max_wait=INFER_MAX_WAIT
+    ).start()
+    evidence = EvidenceWriter(BACKEND_URL, SECRET_KEY, timeout=HTTP_TIMEOUT * 2).start() if SAVE_EVIDENCE else None
+    sem = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+    running = set()
 
     print(f"Polling backend at {BACKEND_URL} every {POLL_INTERVAL_SECONDS} seconds...")
-    while True:
+    async with httpx.AsyncClient(
+        base_url=BACKEND_URL,
+        headers={"X-Secret": SECRET_KEY},
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=MAX_CONCURRENT_TASKS + 1),
+    ) as client:
+        reporter = asyncio.create_task(report_health(client, cameras, scheduler))
         try:
-            # Lấy nhiệm vụ từ backend
-            response = requests.get(f"{BACKEND_URL}/capture-task", headers={"X-Secret": SECRET_KEY}, timeout=5)
-            response.raise_for_status()
-            task_data = response.json()
-
-            if task_data.get("task") == "capture_plate":
-                session_id = task_data.get("session_id")
-                if session_id:
-                    process_capture_task(session_id, cap)
-                else:
-                    print("Warning: Received capture task without a session_id.")
-
-            # Đợi trước khi hỏi việc lần nữa
-            time.sleep(POLL_INTERVAL_SECONDS)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Could not connect to backend: {e}. Retrying in {POLL_INTERVAL_SECONDS}s...")
-            time.sleep(POLL_INTERVAL_SECONDS)
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}. Retrying in {POLL_INTERVAL_SECONDS}s...")
-            time.sleep(POLL_INTERVAL_SECONDS)
+            while True:
+                # chỉ nhận việc mới khi còn chỗ -> không ôm task mà không kịp chụp
+                await sem.acquire()
+                got_task = False
+                try:
+                    # Lấy nhiệm vụ từ backend
+                    response = await client.get("/capture-task", params=task_params)
+                    response.raise_for_status()
+                    task_data = response.json()
+
+                    if task_data.get("task") in ("capture_plate", "capture_exit_plate"):
+                        session_id = task_data.get("session_id")
+                        if session_id:
+                            camera = by_lane.get(task_data.get("lane"), default_cam)
+                            exit_lane = task_data["task"] == "capture_exit_plate"
+                            t = asyncio.create_task(_run_task(sem, session_id, camera, client, scheduler,
+                                                              evidence, exit_lane))
+                            running.add(t)
+                            t.add_done_callback(running.discard)
+                            got_task = True
+                        else:
+                            print("Warning: Received capture task without a session_id.")
+                except httpx.HTTPError as e:
+                    print(f"Could not connect to backend: {e}. Retrying in {POLL_INTERVAL_SECONDS}s...")
+                except Exception as e:
+                    print(f"An unexpected error occurred: {e}. Retrying in {POLL_INTERVAL_SECONDS}s...")
+                finally:
+                    if not got_task:
+                        sem.release()
+
+                # Có việc -> hỏi tiếp ngay (xe nối đuôi); không có -> đợi
+                if not got_task:
+                    await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        finally:
+            reporter.cancel()
+            for t in running:
+                t.cancel()
+            scheduler.stop()
+            if evidence is not None:
+                evidence.stop()
+            for cam in cameras:
+                cam.close()
+
+def main_loop():
+    load_models()
+    try:
+        asyncio.run(main_async())
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main_loop()
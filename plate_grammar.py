@@ -0,0 +1,190 @@
+# plate_grammar.py
+# Ngữ pháp biển số Việt Nam + giải mã có ràng buộc.
+#   - mỗi mẫu biển (mã tỉnh, sê-ri, nhóm số; 1 dòng hoặc 2 dòng) được biên dịch chung vào 1 automaton
+#     (trie trên lớp ký tự: N = số 1-9, D = số, L = chữ sê-ri, | = ranh giới dòng trên / dòng dưới)
+#   - ký tự từ char recognizer được gom theo vị trí (box chồng nhau -> nhiều lựa chọn + conf)
+#   - Viterbi trên (vị trí, trạng thái) chọn chuỗi HỢP LỆ có xác suất cao nhất; O/0, B/8... chỉ đổi
+#     khi vị trí đó bắt buộc là số/chữ (thay cho việc đổi O->0 cả chuỗi)
+#   - không có chuỗi hợp lệ -> None: bỏ kết quả sai ngay, không cho vào bỏ phiếu
+import os
+import math
+
+# Chữ dùng cho sê-ri (không có I, J, O, Q, W)
+SERIES_LETTERS = "ABCDEFGHKLMNPRSTUVXYZ"
+CLASS_CHARS = {
+    "N": "123456789",          # chữ số đầu mã tỉnh (11..99)
+    "D": "0123456789",
+    "L": SERIES_LETTERS,
+}
+
+# Mẫu biển: "|" là ranh giới giữa dòng trên (tỉnh + sê-ri) và dòng dưới (nhóm số).
+# Ảnh 1 dòng không có ngắt dòng -> ranh giới được chèn tự do; text ra luôn "TỈNH+SÊRI SỐ".
+# Giá trị = log prior: 59X12345 (1 dòng) vừa khớp LD|DDDD vừa L|DDDDD -> ưu tiên mẫu ô tô 1 dòng.
+PLATE_PATTERNS = {
+    "NDL|DDDDD":  0.0,     # ô tô: 51A 12345 (51A-123.45)
+    "NDL|DDDD":  -0.2,     # ô tô cũ: 51A 1234
+    "NDLL|DDDDD": -0.3,    # sê-ri 2 chữ: 51LD 12345
+    "NDLL|DDDD": -0.4,
+    "NDLD|DDDDD": -0.1,    # xe máy 2 dòng: 59X1 12345
+    "NDLD|DDDD": -0.2,     # xe máy cũ: 59X1 1234
+}
+
+# Nhầm lẫn chữ <-> số hay gặp của char recognizer: (ký tự đọc được -> ký tự thay thế)
+CONFUSIONS = {
+    "O": "0", "D": "0", "Q": "0", "U": "0", "I": "1", "J": "1", "Z": "2", "S": "5",
+    "G": "6", "T": "7", "B": "8", "A": "4",
+    "0": "D", "1": "T", "2": "Z", "4": "A", "5": "S", "6": "G", "7": "T", "8": "B",
+}
+CONFUSION_WEIGHT = 0.5               # xác suất ký tự thay thế = conf gốc * hệ số này
+SKIP_LOGP = math.log(0.05)           # bỏ 1 box thừa (box trùng / vết bẩn)
+BREAK_SKIP_LOGP = math.log(0.5)      # ngắt dòng không đúng chỗ (tách dòng sai)
+MERGE_IOU = 0.5                      # box chồng nhau hơn mức này -> cùng 1 vị trí
+BREAK = None                         # token ngắt dòng trong chuỗi vị trí
+
+# Bật (mặc định): chuỗi không khớp mẫu nào bị loại; tắt để nhận cả biển đặc biệt (NG, quân đội...)
+STRICT = os.getenv("PLATE_GRAMMAR_STRICT", "1") == "1"
+
+# Đủ tự tin để dừng burst sớm: mọi ký tự trên đường đi có xác suất >= ngưỡng này
+CONFIDENT_PROB = float(os.getenv("PLATE_CONFIDENT_PROB", "0.8"))
+
+
+class PlateGrammar:
+    """Automaton (trie) trên lớp ký tự; decode(tokens) -> kết quả hợp lệ tốt nhất hoặc None."""
+
+    def __init__(self, patterns=None):
+        patterns = PLATE_PATTERNS if patterns is None else patterns
+        self.trans = [{}]      # state -> {lớp: state kế}
+        self.accept = {}       # state -> (tên mẫu, log prior)
+        for pattern, prior in patterns.items():
+            st = 0
+            for cls in pattern:
+                nxt = self.trans[st].get(cls)
+                if nxt is None:
+                    nxt = len(self.trans)
+                    self.trans.append({})
+                    self.trans[st][cls] = nxt
+                st = nxt
+            self.accept[st] = (pattern, prior)
+        # ký tự -> các lớp chứa nó (số 5 thuộc cả N và D)
+        self.char_classes = {}
+        for cls, chars in CLASS_CHARS.items():
+            for ch in chars:
+                self.char_classes.setdefault(ch, []).append(cls)
+
+    def _expand(self, dist):
+        """{ký tự: conf} -> {ký tự: xác suất} gồm cả ký tự thay thế do nhầm lẫn."""
+        out = dict(dist)
+        for ch, p in dist.items():
+            alt = CONFUSIONS.get(ch)
+            if alt is not None:
+                out[alt] = max(out.get(alt, 0.0), p * CONFUSION_WEIGHT)
+        return out
+
+    @staticmethod
+    def _relax(table, st, score, text, min_p):
+        cur = table.get(st)
+        if cur is None or score > cur[0]:
+            table[st] = (score, text, min_p)
+
+    def _close_boundary(self, dp):
+        # ảnh không có ngắt dòng ở ranh giới (biển 1 dòng / tách dòng sót) -> qua "|" miễn phí
+        for st, (score, text, min_p) in list(dp.items()):
+            nxt = self.trans[st].get("|")
+            if nxt is not None:
+                self._relax(dp, nxt, score, text + " ", min_p)
+
+    def decode(self, tokens):
+        """
+        tokens: list theo thứ tự đọc; mỗi phần tử là dict {ký tự: conf} của 1 vị trí hoặc BREAK.
+        -> dict {text, logp, min_prob, pattern, confident} hoặc None nếu không có cách đọc hợp lệ.
+        """
+        dp = {0: (0.0, "", 1.0)}
+        self._close_boundary(dp)
+        for tok in tokens:
+            new = {}
+            for st, (score, text, min_p) in dp.items():
+                if tok is BREAK:
+                    nxt = self.trans[st].get("|")
+                    if nxt is not None:
+                        self._relax(new, nxt, score, text + " ", min_p)
+                    self._relax(new, st, score + BREAK_SKIP_LOGP, text, min_p)
+                    continue
+                self._relax(new, st, score + SKIP_LOGP, text, min_p)
+                for ch, p in self._expand(tok).items():
+                    if p <= 0:
+                        continue
+                    for cls in self.char_classes.get(ch, ()):
+                        nxt = self.trans[st].get(cls)
+                        if nxt is not None:
+                            self._relax(new, nxt, score + math.log(p), text + ch, min(min_p, p))
+            if not new:
+                return None
+            dp = new
+            self._close_boundary(dp)
+
+        best = None
+        for st, (score, text, min_p) in dp.items():
+            if st not in self.accept:
+                continue
+            pattern, prior = self.accept[st]
+            total = score + prior
+            if best is None or total > best["logp"]:
+                best = {"text": text, "logp": total, "min_prob": min_p, "pattern": pattern}
+        if best is not None:
+            best["confident"] = best["min_prob"] >= CONFIDENT_PROB
+        return best
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detections_to_tokens(char_detections, line_gap=0.6):
+    """
+    char_detections: list [x1, y1, x2, y2, ký tự, conf].
+    Box chồng nhau (khác lớp) -> 1 vị trí nhiều lựa chọn; tách dòng theo khoảng cách tâm y
+    (> line_gap * chiều cao TB -> dòng mới); trả tokens theo thứ tự đọc, có BREAK giữa các dòng.
+    """
+    positions = []  # [box, {ký tự: conf}]
+    for x1, y1, x2, y2, ch, conf in sorted(char_detections, key=lambda d: -d[5]):
+        box = (x1, y1, x2, y2)
+        for pos in positions:
+            if _iou(pos[0], box) > MERGE_IOU:
+                pos[1][ch] = max(pos[1].get(ch, 0.0), float(conf))
+                break
+        else:
+            positions.append([box, {ch: float(conf)}])
+    if not positions:
+        return []
+
+    avg_h = sum(p[0][3] - p[0][1] for p in positions) / len(positions)
+    positions.sort(key=lambda p: (p[0][1] + p[0][3]) / 2)
+    lines, cur = [], [positions[0]]
+    for pos in positions[1:]:
+        if abs((pos[0][1] + pos[0][3]) / 2 - (cur[-1][0][1] + cur[-1][0][3]) / 2) < line_gap * avg_h:
+            cur.append(pos)
+        else:
+            lines.append(cur)
+            cur = [pos]
+    lines.append(cur)
+
+    tokens = []
+    for i, line in enumerate(lines):
+        if i:
+            tokens.append(BREAK)
+        tokens.extend(dist for _, dist in sorted(line, key=lambda p: p[0][0]))
+    return tokens
+
+
+_default_grammar = None
+
+def decode_plate(char_detections):
+    """Tiện ích: detections -> kết quả decode của ngữ pháp mặc định (hoặc None)."""
+    global _default_grammar
+    if _default_grammar is None:
+        _default_grammar = PlateGrammar()
+    return _default_grammar.decode(detections_to_tokens(char_detections))
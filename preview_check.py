@@ -83,7 +83,7 @@ try:
         else:
             ui.render(frame)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'): break
+        if ui.wait_key(1) & 0xFF == ord('q'): break
         time.sleep(0.01)
 finally:
     cap.release(); ui.close()
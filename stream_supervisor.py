@@ -0,0 +1,245 @@
+# stream_supervisor.py
+# Giám sát stream camera: mỗi kết nối có 1 thread đọc frame liên tục; thread giám sát (watchdog,
+# nằm NGOÀI thread đọc) phát hiện treo theo tuổi frame cuối - kể cả khi read() bị kẹt không trả về -
+# rồi bỏ thread đọc đó và mở capture mới với backoff tăng dần. Model không bị tải lại - chỉ
+# VideoCapture/RingCapture được tạo mới. health() cho biết FPS, số lần reconnect và tuổi frame cuối
+# để báo về backend.
+# Capture có read_leased() (RingCapture, shared memory): frame không bị copy ở tốc độ stream -
+# slot được giữ tới khi có frame mới, consumer copy (dưới lock) đúng những frame nó lấy.
+import os
+import time
+import random
+import threading
+
+import cv2
+
+STALL_SECONDS = float(os.getenv("STREAM_STALL_SECONDS", "3"))       # không có frame mới quá lâu -> coi là treo
+BACKOFF_MIN = float(os.getenv("STREAM_BACKOFF_MIN", "0.5"))
+BACKOFF_MAX = float(os.getenv("STREAM_BACKOFF_MAX", "15"))
+OPEN_TIMEOUT_MS = int(os.getenv("STREAM_OPEN_TIMEOUT_MS", "5000"))
+READ_TIMEOUT_MS = int(os.getenv("STREAM_READ_TIMEOUT_MS", "3000"))
+
+
+def open_video_capture(source):
+    """cv2.VideoCapture có timeout mở/đọc (OpenCV >= 4.5.3) -> read() không treo vô hạn khi mất mạng."""
+    if isinstance(source, str) and hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+        cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS,
+        ])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    return cv2.VideoCapture(source)
+
+
+class StreamSupervisor:
+    """
+    open_capture() -> đối tượng kiểu VideoCapture (read/isOpened/get/release).
+    latest() -> (seq, frame); wait_frame(after_seq, timeout) chờ frame mới (blocking).
+    Với capture dạng lease (RingCapture) frame trả về là bản copy riêng; seq rẻ, dùng để dò frame mới.
+    """
+
+    def __init__(self, open_capture, name="camera",
+                 stall_seconds=STALL_SECONDS, backoff_min=BACKOFF_MIN, backoff_max=BACKOFF_MAX):
+        self.open_capture = open_capture
+        self.name = name
+        self.stall_seconds = float(stall_seconds)
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._lease = None  # (cap, slot) của self._frame khi frame là view trong ring
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{name}", daemon=True)
+
+        # health
+        self.state = "connecting"
+        self.reconnects = 0
+        self.last_error = None
+        self.frame_size = None     # (w, h) của frame cuối
+        self._last_frame_at = None
+        self._fps = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+    # ---- consumer ----
+    @property
+    def seq(self):
+        return self._seq
+
+    def _current(self, not_before=None):
+        # gọi khi đang giữ self._cond: slot chỉ được trả lại ring dưới cùng lock nên copy không bị ghi đè
+        if not_before is not None and (self._last_frame_at is None or self._last_frame_at < not_before):
+            return self._seq, None  # frame hiện có chụp trước mốc not_before (vd. trước khi camera mất)
+        frame = self._frame
+        if frame is not None and self._lease is not None:
+            frame = frame.copy()
+        return self._seq, frame
+
+    def latest(self, not_before=None):
+        """not_before: mốc time.monotonic(); frame chụp trước mốc này trả về None."""
+        with self._cond:
+            return self._current(not_before)
+
+    def wait_frame(self, after_seq, timeout=1.0):
+        """-> (seq, frame) mới hơn after_seq, hoặc (after_seq, None) nếu hết timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= after_seq or self._frame is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return after_seq, None
+                self._cond.wait(remaining)
+            return self._current()
+
+    def last_frame_age(self):
+        t = self._last_frame_at
+        return None if t is None else time.monotonic() - t
+
+    def is_live(self):
+        age = self.last_frame_age()
+        return age is not None and age < self.stall_seconds
+
+    def health(self):
+        age = self.last_frame_age()
+        live = age is not None and age < self.stall_seconds
+        state = self.state
+        if state == "streaming" and not live and age is not None:
+            state = "stalled"  # read() đang bị treo, chưa trả về
+        return {
+            "state": state,
+            "fps": round(self._fps, 1) if live else 0.0,
+            "reconnects": self.reconnects,
+            "last_frame_age": None if age is None else round(age, 2),
+            "frame_size": self.frame_size,
+            "last_error": self.last_error,
+        }
+
+    # ---- watchdog (thread giám sát) + thread đọc ----
+    def _open(self):
+        try:
+            cap = self.open_capture()
+        except Exception as e:
+            self.last_error = f"open failed: {e}"
+            return None
+        if cap is None or not cap.isOpened():
+            self.last_error = "open failed"
+            if cap is not None:
+                cap.release()
+            return None
+        return cap
+
+    def _sleep_backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_min * (2 ** attempt))
+        self._stop.wait(delay * random.uniform(0.8, 1.2))  # jitter: nhiều camera không reconnect cùng lúc
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                self.state = "reconnecting"
+                print(f"[{self.name}] Cannot open stream ({self.last_error}); retry #{attempt + 1}")
+                self._sleep_backoff(attempt)
+                attempt += 1
+                continue
+
+            self.state = "streaming"
+            opened_at = time.monotonic()
+            abandon = threading.Event()
+            reader = threading.Thread(target=self._read_loop, args=(cap, abandon),
+                                      name=f"stream-{self.name}-read", daemon=True)
+            reader.start()
+            reason = self._watch(reader, opened_at)
+            abandon.set()
+            with self._cond:
+                if self._lease is None:
+                    self._frame = None  # frame của kết nối đã chết không được dùng cho nhiệm vụ sau
+            reader.join(timeout=0.5)
+            if reader.is_alive() and not self._stop.is_set():
+                # read() kẹt (driver/FFmpeg không tôn trọng timeout): để thread đó tự release cap
+                # khi read() trả về, frame muộn của nó bị bỏ; mở kết nối mới ngay
+                print(f"[{self.name}] read() is stuck; abandoning reader thread")
+            if self._stop.is_set():
+                break
+
+            # có frame sau khi mở -> stream từng tốt, reset backoff
+            if self._last_frame_at is not None and self._last_frame_at > opened_at:
+                attempt = 0
+            self.last_error = reason
+            self.state = "reconnecting"
+            self.reconnects += 1
+            print(f"[{self.name}] Stream stalled ({reason}); reconnecting (#{self.reconnects})...")
+            self._sleep_backoff(attempt)
+            attempt += 1
+        self.state = "stopped"
+
+    def _watch(self, reader, opened_at):
+        """Watchdog: chạy trong thread giám sát, trả lý do khi cần mở lại kết nối."""
+        tick = min(0.2, self.stall_seconds / 4)
+        while not self._stop.wait(tick):
+            if not reader.is_alive():
+                return "reader exited"
+            now = time.monotonic()
+            since = max(self._last_frame_at or opened_at, opened_at)
+            if now - since >= self.stall_seconds:
+                return f"no frame for {now - since:.1f}s"
+        return "stopped"
+
+    def _read_loop(self, cap, abandon):
+        """Thread đọc của 1 kết nối: chỉ đọc + phát frame; quyết định treo/reconnect là của watchdog."""
+        leased = hasattr(cap, "read_leased")
+        try:
+            while not abandon.is_set() and not self._stop.is_set():
+                if leased:
+                    ok, frame, slot = cap.read_leased()
+                else:
+                    ok, frame = cap.read()
+                if not (ok and frame is not None and frame.size > 0):
+                    if leased and ok:
+                        cap.release_slot(slot)  # frame rỗng
+                    time.sleep(0.05)
+                    continue
+                now = time.monotonic()
+                with self._cond:
+                    if abandon.is_set():
+                        # watchdog đã bỏ kết nối này (có thể đã có kết nối mới) -> không phát frame muộn
+                        if leased:
+                            cap.release_slot(slot)
+                        break
+                    prev = self._last_frame_at
+                    if prev is not None:
+                        dt = now - prev
+                        if 0 < dt < self.stall_seconds:
+                            self._fps = 1.0 / dt if self._fps == 0.0 else 0.9 * self._fps + 0.1 / dt
+                    self.frame_size = (frame.shape[1], frame.shape[0])
+                    old = self._lease
+                    self._frame = frame
+                    self._lease = (cap, slot) if leased else None
+                    self._seq += 1
+                    self._last_frame_at = now
+                    if old is not None:
+                        old[0].release_slot(old[1])  # không consumer nào đang copy frame cũ
+                    self._cond.notify_all()
+        except Exception as e:
+            self.last_error = f"read failed: {e}"
+        finally:
+            if leased:
+                # ring sắp bị đóng: bỏ view (nếu còn là của kết nối này) trước khi shared memory bị unmap
+                with self._cond:
+                    if self._lease is not None and self._lease[0] is cap:
+                        cap.release_slot(self._lease[1])
+                        self._lease = None
+                        self._frame = None
+            cap.release()
@@ -1,19 +1,35 @@
 # main_app.py — ANPR Hybrid + Stable Preview (Lock + EMA) + Fallback + SafeCrop
 # (ĐÃ CHÈN: last_preview_img, safe_crop, best-frame fallback, lock state, stream-lost overlay + tách UI)
 
+import os
 import cv2
 import numpy as np
 from collections import deque, Counter, defaultdict
 from ultralytics import YOLO
 from ui_display import UIDisplay  # <-- UI tách riêng
+from detector_input import Prescaler, box_to_full, load_camera_profile
+from stream_supervisor import StreamSupervisor, open_video_capture
+from plate_grammar import decode_plate, STRICT as PLATE_GRAMMAR_STRICT
 
 # =========================
 # 1) MODELS
 # =========================
-vehicle_detector = YOLO("yolov8n.pt")         # COCO: 2=car, 3=motorcycle
-plate_detector   = YOLO("models/plate_detector.pt")
-char_recognizer  = YOLO("models/char_recognizer.pt")
-CHAR_LIST        = char_recognizer.model.names  # id -> char
+# Tải trong main(): capture process (FRAME_TRANSPORT=shm, spawn) import lại file này - không được tải model
+vehicle_detector = plate_detector = char_recognizer = None
+CHAR_LIST = None
+
+def load_models():
+    global vehicle_detector, plate_detector, char_recognizer, CHAR_LIST
+    vehicle_detector = YOLO("yolov8n.pt")         # COCO: 2=car, 3=motorcycle
+    plate_detector   = YOLO("models/plate_detector.pt")
+    char_recognizer  = YOLO("models/char_recognizer.pt")
+    CHAR_LIST        = char_recognizer.model.names  # id -> char
+
+# Profile camera: detector chạy trên ảnh thu nhỏ 1 lần (dùng chung cho vehicle + plate)
+CAMERA_PROFILE = load_camera_profile()
+DET_IMGSZ  = int(CAMERA_PROFILE["det_imgsz"])
+CHAR_IMGSZ = int(CAMERA_PROFILE["char_imgsz"])
+prescale_for_detector = Prescaler(DET_IMGSZ)
 
 # =========================
 # 2) UTILS
@@ -107,6 +123,12 @@ def extract_chars_from_yolo_result(result, conf_thres=0.15):
 
 def format_plate_text_v2(char_dets):
     if not char_dets: return ""
+    # ngữ pháp biển VN: box chồng nhau là các lựa chọn của cùng 1 vị trí -> dùng trước NMS
+    decoded = decode_plate([[c["x1"], c["y1"], c["x2"], c["y2"], c["label"], c["conf"]] for c in char_dets])
+    if decoded is not None:
+        return decoded["text"]
+    if PLATE_GRAMMAR_STRICT:
+        return ""
     chars = nms_boxes_xyxy(char_dets, iou_thresh=0.25)
     if not chars: return ""
     avg_h = float(np.mean([c["h"] for c in chars])) if chars else 0.0
@@ -218,172 +240,192 @@ def safe_crop(img, x1,y1,x2,y2):
 # 4) CAMERA & UI
 # =========================
 URL = "http://10.146.44.250:8080/video"  # đổi URL nếu dùng IP webcam phone
-# cap = cv2.VideoCapture(0)  # dùng webcam máy tính thì bật dòng này và tắt dòng URL
-cap = cv2.VideoCapture(URL)
-if not cap.isOpened():
-    print("[ERR] Không mở được stream. Kiểm tra URL/IP.")
-    raise SystemExit
-
-fw  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))  or 640
-fh  = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
-panel_h = 110
-debug_plate_size = (220, 70)
-
-# UI: set kích thước cửa sổ tối đa (muốn nhỏ hơn nữa thì giảm số dưới)
-ui = UIDisplay(
-    win_name="Parking System - Press Q to quit",
-    max_width=900,
-    max_height=650,
-    allow_resize=True
-)
-
-# =========================
-# 5) MAIN LOOP
-# =========================
-while True:
-    ok, frame = cap.read()
-    if not ok or frame is None or frame.size == 0:
-        ui.show_stream_lost(fw, fh, panel_h=panel_h)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-        continue
-
-    # Ứng viên tốt nhất của frame (PATCH #3)
-    best_frame_candidate = {"key": None, "score": -1.0, "crop": None}
+# SOURCE = 0  # dùng webcam máy tính thì bật dòng này và tắt dòng URL
+SOURCE = URL
+USE_SHM = os.getenv("FRAME_TRANSPORT", "direct").lower() == "shm"
+
+def open_stream():
+    if USE_SHM:
+        # capture process riêng (spawn) ghi vào shared memory
+        from frame_ring import RingCapture
+        return RingCapture(SOURCE)
+    return open_video_capture(SOURCE)
+
+def main():
+    global last_preview_img
+    load_models()
+
+    # Đọc ở thread riêng, mất stream thì tự mở lại với backoff (model không bị tải lại)
+    stream = StreamSupervisor(open_stream, name="camera").start()
+    frame_seq, first_frame = stream.wait_frame(0, timeout=10)
+    if first_frame is None:
+        print("[WARN] Chưa nhận được frame. Kiểm tra URL/IP - vẫn tự thử kết nối lại...")
+        fw, fh = 640, 480
+    else:
+        fh, fw = first_frame.shape[:2]
+    frame_seq = 0  # cho phép dùng luôn frame đầu
+    panel_h = 110
+    debug_plate_size = (220, 70)
+    # panel cấp phát 1 lần, vẽ lại khi nội dung đổi (UI_MJPEG_PORT / UI_HEADLESS=1: xem qua trình duyệt)
     debug_panel = np.zeros((panel_h, fw, 3), dtype="uint8")
-
-    # PATCH #1b: show last preview if no new yet
-    if last_preview_img is not None:
-        try:
-            debug_panel[20:20+debug_plate_size[1], 20:20+debug_plate_size[0]] = last_preview_img
-        except:
-            pass
-
-    final_plate_text = "N/A"
-
-    # Detect
-    veh_res = vehicle_detector(frame, classes=[2,3], conf=0.5)[0]
-    plt_res = plate_detector(frame, conf=0.55)[0]
-
-    vehicles, plates = [], []
-    if veh_res.boxes is not None and veh_res.boxes.data is not None:
-        for v in veh_res.boxes.data.tolist():
-            vx1,vy1,vx2,vy2,vconf,vcls = v[:6]
-            vehicles.append((int(vx1),int(vy1),int(vx2),int(vy2), float(vconf), int(vcls)))
-    if plt_res.boxes is not None and plt_res.boxes.data is not None:
-        for p in plt_res.boxes.data.tolist():
-            px1,py1,px2,py2,pconf,pcls = p[:6]
-            plates.append((int(px1),int(py1),int(px2),int(py2), float(pconf), int(pcls)))
-
-    processed = set()
-
-    # ƯU TIÊN 1: gán plate cho vehicle (center-in)
-    for vx1,vy1,vx2,vy2,vconf,vcls in vehicles:
+    drawn_panel_state = None
+
+    # UI: set kích thước cửa sổ tối đa (muốn nhỏ hơn nữa thì giảm số dưới)
+    ui = UIDisplay(
+        win_name="Parking System - Press Q to quit",
+        max_width=900,
+        max_height=650,
+        allow_resize=True
+    )
+
+    # =========================
+    # 5) MAIN LOOP
+    # =========================
+    while True:
+        # chờ frame mới (block tối đa 0.5s) thay vì quay vòng waitKey(1) khi mất stream
+        frame_seq, frame = stream.wait_frame(frame_seq, timeout=0.5)
+        if frame is None:
+            ui.show_stream_lost(fw, fh, panel_h=panel_h)
+            if ui.wait_key(50) & 0xFF == ord('q'):
+                break
+            continue
+
+        # Ứng viên tốt nhất của frame (PATCH #3)
+        best_frame_candidate = {"key": None, "score": -1.0, "crop": None}
+
+        final_plate_text = "N/A"
+
+        # Detect
+        det_img, det_scale = prescale_for_detector(frame)
+        veh_res = vehicle_detector(det_img, imgsz=DET_IMGSZ, classes=[2,3], conf=0.5)[0]
+        plt_res = plate_detector(det_img, imgsz=DET_IMGSZ, conf=0.55)[0]
+
+        vehicles, plates = [], []
+        if veh_res.boxes is not None and veh_res.boxes.data is not None:
+            for v in veh_res.boxes.data.tolist():
+                vx1,vy1,vx2,vy2 = box_to_full(v[:4], det_scale, frame.shape)
+                vehicles.append((vx1,vy1,vx2,vy2, float(v[4]), int(v[5])))
+        if plt_res.boxes is not None and plt_res.boxes.data is not None:
+            for p in plt_res.boxes.data.tolist():
+                px1,py1,px2,py2 = box_to_full(p[:4], det_scale, frame.shape)
+                plates.append((px1,py1,px2,py2, float(p[4]), int(p[5])))
+
+        processed = set()
+
+        # ƯU TIÊN 1: gán plate cho vehicle (center-in)
+        for vx1,vy1,vx2,vy2,vconf,vcls in vehicles:
+            for j,(px1,py1,px2,py2,pconf,pcls) in enumerate(plates):
+                if j in processed: continue
+                pcx, pcy = (px1+px2)/2.0, (py1+py2)/2.0
+                if vx1 < pcx < vx2 and vy1 < pcy < vy2:
+                    processed.add(j)
+
+                    vname = vehicle_detector.model.names.get(vcls,"VEH")
+                    cv2.rectangle(frame,(vx1,vy1),(vx2,vy2),(255,0,0),2)
+                    cv2.putText(frame,f"{vname.upper()} {vconf:.2f}",(vx1,max(20,vy1-8)),
+                                cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,0,0),2)
+                    cv2.rectangle(frame,(px1,py1),(px2,py2),(0,255,0),2)
+
+                    key = bbox_center_key(px1,py1,px2,py2, grid=60)
+                    sx1,sy1,sx2,sy2 = ema_bbox(key, px1,py1,px2,py2)
+                    preview_crop = safe_crop(frame, sx1,sy1,sx2,sy2)
+
+                    ocr_crop = safe_crop(frame, px1,py1,px2,py2)
+                    if ocr_crop is not None:
+                        ocr_crop = rectify_plate(ocr_crop)
+                        ocr_crop = enhance_plate(ocr_crop)
+
+                        chars_res = char_recognizer(ocr_crop, imgsz=CHAR_IMGSZ, conf=0.15)[0]
+                        char_dets = extract_chars_from_yolo_result(chars_res, conf_thres=0.15)
+                        plate_txt = format_plate_text_v2(char_dets)
+                        add_plate_reading(key, plate_txt)
+                        smoothed = best_plate_from_history(key)
+                        plate_score = score_plate(plate_txt, char_dets)
+
+                        has_det = preview_crop is not None and preview_crop.size > 0
+                        update_lock(key, plate_score, has_det)
+
+                        if has_det and plate_score > best_frame_candidate["score"]:
+                            best_frame_candidate = {"key": key, "score": plate_score, "crop": preview_crop.copy()}
+
+                        if locked_key == key and has_det:
+                            try:
+                                last_preview_img = cv2.resize(preview_crop, debug_plate_size)
+                            except:
+                                pass
+
+                        final_plate_text = smoothed or plate_txt or "READING..."
+                    break
+
+        # ƯU TIÊN 2: biển “mồ côi”
         for j,(px1,py1,px2,py2,pconf,pcls) in enumerate(plates):
             if j in processed: continue
-            pcx, pcy = (px1+px2)/2.0, (py1+py2)/2.0
-            if vx1 < pcx < vx2 and vy1 < pcy < vy2:
-                processed.add(j)
-
-                vname = vehicle_detector.model.names.get(vcls,"VEH")
-                cv2.rectangle(frame,(vx1,vy1),(vx2,vy2),(255,0,0),2)
-                cv2.putText(frame,f"{vname.upper()} {vconf:.2f}",(vx1,max(20,vy1-8)),
-                            cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,0,0),2)
-                cv2.rectangle(frame,(px1,py1),(px2,py2),(0,255,0),2)
-
-                key = bbox_center_key(px1,py1,px2,py2, grid=60)
-                sx1,sy1,sx2,sy2 = ema_bbox(key, px1,py1,px2,py2)
-                preview_crop = safe_crop(frame, sx1,sy1,sx2,sy2)
-
-                ocr_crop = safe_crop(frame, px1,py1,px2,py2)
-                if ocr_crop is not None:
-                    ocr_crop = rectify_plate(ocr_crop)
-                    ocr_crop = enhance_plate(ocr_crop)
-
-                    chars_res = char_recognizer(ocr_crop, conf=0.15)[0]
-                    char_dets = extract_chars_from_yolo_result(chars_res, conf_thres=0.15)
-                    plate_txt = format_plate_text_v2(char_dets)
-                    add_plate_reading(key, plate_txt)
-                    smoothed = best_plate_from_history(key)
-                    plate_score = score_plate(plate_txt, char_dets)
-
-                    has_det = preview_crop is not None and preview_crop.size > 0
-                    update_lock(key, plate_score, has_det)
-
-                    if has_det and plate_score > best_frame_candidate["score"]:
-                        best_frame_candidate = {"key": key, "score": plate_score, "crop": preview_crop.copy()}
-
-                    if locked_key == key and has_det:
-                        try:
-                            plate_preview = cv2.resize(preview_crop, debug_plate_size)
-                            debug_panel[20:20+debug_plate_size[1], 20:20+debug_plate_size[0]] = plate_preview
-                            last_preview_img = plate_preview.copy()
-                        except:
-                            pass
-
-                    final_plate_text = smoothed or plate_txt or "READING..."
-                break
-
-    # ƯU TIÊN 2: biển “mồ côi”
-    for j,(px1,py1,px2,py2,pconf,pcls) in enumerate(plates):
-        if j in processed: continue
-        cv2.rectangle(frame,(px1,py1),(px2,py2),(0,255,0),2)
-
-        key = bbox_center_key(px1,py1,px2,py2, grid=60)
-        sx1,sy1,sx2,sy2 = ema_bbox(key, px1,py1,px2,py2)
-        preview_crop = safe_crop(frame, sx1,sy1,sx2,sy2)
-
-        ocr_crop = safe_crop(frame, px1,py1,px2,py2)
-        if ocr_crop is not None:
-            ocr_crop = rectify_plate(ocr_crop)
-            ocr_crop = enhance_plate(ocr_crop)
+            cv2.rectangle(frame,(px1,py1),(px2,py2),(0,255,0),2)
+
+            key = bbox_center_key(px1,py1,px2,py2, grid=60)
+            sx1,sy1,sx2,sy2 = ema_bbox(key, px1,py1,px2,py2)
+            preview_crop = safe_crop(frame, sx1,sy1,sx2,sy2)
+
+            ocr_crop = safe_crop(frame, px1,py1,px2,py2)
+            if ocr_crop is not None:
+                ocr_crop = rectify_plate(ocr_crop)
+                ocr_crop = enhance_plate(ocr_crop)
+
+                chars_res = char_recognizer(ocr_crop, imgsz=CHAR_IMGSZ, conf=0.15)[0]
+                char_dets = extract_chars_from_yolo_result(chars_res, conf_thres=0.15)
+                plate_txt = format_plate_text_v2(char_dets)
+                add_plate_reading(key, plate_txt)
+                smoothed = best_plate_from_history(key)
+                plate_score = score_plate(plate_txt, char_dets)
+
+                has_det = preview_crop is not None and preview_crop.size > 0
+                update_lock(key, plate_score, has_det)
+
+                if has_det and plate_score > best_frame_candidate["score"]:
+                    best_frame_candidate = {"key": key, "score": plate_score, "crop": preview_crop.copy()}
+
+                if locked_key == key and has_det:
+                    try:
+                        last_preview_img = cv2.resize(preview_crop, debug_plate_size)
+                    except:
+                        pass
+
+                final_plate_text = smoothed or plate_txt or "READING..."
+
+        # PATCH #3b: nếu chưa lock, show best-frame candidate để tránh đen
+        if locked_key is None and best_frame_candidate["crop"] is not None:
+            try:
+                last_preview_img = cv2.resize(best_frame_candidate["crop"], debug_plate_size)
+            except:
+                pass
+
+        # Panel chỉ vẽ lại khi nội dung đổi (preview / trạng thái lock / text)
+        lock_state = "LOCKED" if locked_key is not None else "UNLOCKED"
+        panel_state = (id(last_preview_img), lock_state, str(final_plate_text))
+        if panel_state != drawn_panel_state:
+            drawn_panel_state = panel_state
+            debug_panel[:] = 0
+            if last_preview_img is not None:
+                try:
+                    debug_panel[20:20+debug_plate_size[1], 20:20+debug_plate_size[0]] = last_preview_img
+                except:
+                    pass
+            cv2.putText(debug_panel, f"PREVIEW: {lock_state}", (debug_plate_size[0]+40, 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (180,180,180), 1)
+            cv2.putText(debug_panel, "DETECTED PLATE:", (debug_plate_size[0]+40, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
+            cv2.putText(debug_panel, str(final_plate_text), (debug_plate_size[0]+40, 90),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0,255,0), 2)
 
-            chars_res = char_recognizer(ocr_crop, conf=0.15)[0]
-            char_dets = extract_chars_from_yolo_result(chars_res, conf_thres=0.15)
-            plate_txt = format_plate_text_v2(char_dets)
-            add_plate_reading(key, plate_txt)
-            smoothed = best_plate_from_history(key)
-            plate_score = score_plate(plate_txt, char_dets)
+        # === HIỂN THỊ: UI tự co nhỏ về max size, giới hạn FPS hiển thị (UI_MAX_FPS) ===
+        ui.render(frame, panel=debug_panel)
 
-            has_det = preview_crop is not None and preview_crop.size > 0
-            update_lock(key, plate_score, has_det)
+        if ui.wait_key(1) & 0xFF == ord('q'):
+            break
 
-            if has_det and plate_score > best_frame_candidate["score"]:
-                best_frame_candidate = {"key": key, "score": plate_score, "crop": preview_crop.copy()}
+    stream.stop()
+    ui.close()
 
-            if locked_key == key and has_det:
-                try:
-                    plate_preview = cv2.resize(preview_crop, debug_plate_size)
-                    debug_panel[20:20+debug_plate_size[1], 20:20+debug_plate_size[0]] = plate_preview
-                    last_preview_img = plate_preview.copy()
-                except:
-                    pass
 
-            final_plate_text = smoothed or plate_txt or "READING..."
-
-    # PATCH #3b: nếu chưa lock, show best-frame candidate để tránh đen
-    if locked_key is None and best_frame_candidate["crop"] is not None:
-        try:
-            plate_preview = cv2.resize(best_frame_candidate["crop"], debug_plate_size)
-            debug_panel[20:20+debug_plate_size[1], 20:20+debug_plate_size[0]] = plate_preview
-            last_preview_img = plate_preview.copy()
-        except:
-            pass
-
-    # Panel text + trạng thái lock
-    lock_state = "LOCKED" if locked_key is not None else "UNLOCKED"
-    cv2.putText(debug_panel, f"PREVIEW: {lock_state}", (debug_plate_size[0]+40, 20),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (180,180,180), 1)
-    cv2.putText(debug_panel, "DETECTED PLATE:", (debug_plate_size[0]+40, 50),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
-    cv2.putText(debug_panel, str(final_plate_text), (debug_plate_size[0]+40, 90),
-                cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0,255,0), 2)
-
-    # === HIỂN THỊ: chỉ 1 dòng, UI tự co nhỏ về max size ===
-    ui.render(frame, panel=debug_panel)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
-ui.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# tests/conftest.py
+# Worker modules live at the project root, backend modules import each other as siblings
+# from backend_server/ (the way uvicorn runs them) -> both go on sys.path.
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (ROOT, os.path.join(ROOT, "backend_server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,73 @@
+# tests/test_plate_grammar.py
+from plate_grammar import BREAK, PlateGrammar, decode_plate, detections_to_tokens
+
+
+def one_line(text, conf=0.95, y=0):
+    return [[i * 20, y, i * 20 + 18, y + 40, ch, conf] for i, ch in enumerate(text)]
+
+
+def two_lines(top, bottom, conf=0.95):
+    return one_line(top, conf, y=0) + one_line(bottom, conf, y=50)
+
+
+def test_tokens_split_lines():
+    tokens = detections_to_tokens(two_lines("59X1", "12345"))
+    assert tokens.index(BREAK) == 4
+    assert [next(iter(t)) for t in tokens if t is not BREAK] == list("59X112345")
+
+
+def test_overlapping_boxes_become_one_position():
+    dets = one_line("51A12345")
+    dets.append([40, 0, 58, 40, "4", 0.3])  # second guess on the "A" box
+    tokens = detections_to_tokens(dets)
+    assert len(tokens) == 8
+    assert tokens[2] == {"A": 0.95, "4": 0.3}
+
+
+def test_decode_one_line_car():
+    res = decode_plate(one_line("51A12345"))
+    assert res["text"] == "51A 12345"
+    assert res["pattern"] == "NDL|DDDDD"
+    assert res["confident"]
+
+
+def test_decode_old_one_line_car():
+    assert decode_plate(one_line("51A1234"))["text"] == "51A 1234"
+
+
+def test_decode_two_line_motorbike():
+    res = decode_plate(two_lines("59X1", "12345"))
+    assert res["text"] == "59X1 12345"
+    assert res["pattern"] == "NDLD|DDDDD"
+
+
+def test_decode_two_letter_series():
+    assert decode_plate(two_lines("51LD", "12345"))["text"] == "51LD 12345"
+
+
+def test_confusion_letter_in_digit_slot():
+    res = decode_plate(one_line("51A123O5"))
+    assert res["text"] == "51A 12305"
+    assert not res["confident"]  # the swapped character only carries conf * CONFUSION_WEIGHT
+
+
+def test_confusion_digit_in_series_slot():
+    assert decode_plate(one_line("51812345"))["text"] == "51B 12345"
+
+
+def test_confusion_only_where_the_slot_requires_it():
+    # the "S" in the province code becomes 5, the "A" in the series stays a letter
+    assert decode_plate(one_line("S1A12345"))["text"] == "51A 12345"
+
+
+def test_reject_too_short():
+    assert decode_plate(one_line("51A")) is None
+
+
+def test_reject_no_valid_reading():
+    assert decode_plate(one_line("XXXXXXXX")) is None
+
+
+def test_reject_empty():
+    assert decode_plate([]) is None
+    assert PlateGrammar().decode([]) is None
@@ -0,0 +1,121 @@
+# tests/test_plate_index.py
+import sqlite3
+
+import pytest
+
+from plate_index import PlateIndex, bounded_edit_distance, deletion_variants, normalize_plate_key
+
+
+@pytest.fixture
+def index():
+    idx = PlateIndex(max_dist=1)
+    idx.add("s1", "51A-123.45", "card-1")
+    idx.add("s2", "59X1 12345", "card-2")
+    return idx
+
+
+def session_ids(hits):
+    return [h["session_id"] for h in hits]
+
+
+def test_normalize_plate_key():
+    assert normalize_plate_key("51a-123.45") == "51A12345"
+    assert normalize_plate_key(" 59X1 12345 ") == "59X112345"
+    assert normalize_plate_key(None) == ""
+    assert normalize_plate_key("--") == ""
+
+
+def test_bounded_edit_distance():
+    assert bounded_edit_distance("51A12345", "51A12345", 1) == 0
+    assert bounded_edit_distance("51A12345", "51A12346", 1) == 1
+    assert bounded_edit_distance("51A12345", "51A1234", 1) == 1
+    assert bounded_edit_distance("51A12345", "51B12346", 1) == 2   # capped at max_dist + 1
+    assert bounded_edit_distance("51A12345", "51A", 1) == 2        # length gap alone exceeds max_dist
+
+
+def test_deletion_variants():
+    assert deletion_variants("ABC", 1) == {"ABC", "BC", "AC", "AB"}
+    assert deletion_variants("ABC", 0) == {"ABC"}
+
+
+def test_exact_lookup(index):
+    hits = index.lookup("51A 12345")
+    assert hits == [{"session_id": "s1", "card_id": "card-1", "plate_key": "51A12345", "distance": 0}]
+
+
+@pytest.mark.parametrize("plate", [
+    "51A12346",    # substitution
+    "51A1245",     # deletion
+    "51A123455",   # insertion
+    "5LA12345",    # OCR read "1" as "L" in the province code
+])
+def test_lookup_within_distance_one(index, plate):
+    hits = index.lookup(plate)
+    assert session_ids(hits) == ["s1"]
+    assert hits[0]["distance"] == 1
+
+
+def test_lookup_beyond_distance_one(index):
+    assert index.lookup("51B12346") == []
+    assert index.lookup("") == []
+
+
+def test_lookup_max_dist_cannot_exceed_index(index):
+    assert index.lookup("51A12346", max_dist=0) == []
+    assert index.lookup("51B12346", max_dist=2) == []
+
+
+def test_closest_first():
+    idx = PlateIndex(max_dist=1)
+    idx.add("near", "51A12346")
+    idx.add("exact", "51A12345")
+    assert session_ids(idx.lookup("51A12345")) == ["exact", "near"]
+
+
+def test_discard(index):
+    index.discard("s1")
+    assert index.lookup("51A12345") == []
+    assert index.lookup("51A12346") == []
+    assert len(index) == 1
+    assert "51A12345" not in index._variants
+    index.discard("s1")  # unknown session: no-op
+    assert len(index) == 1
+
+
+def test_discard_keeps_other_sessions_on_same_plate():
+    idx = PlateIndex(max_dist=1)
+    idx.add("a", "51A12345")
+    idx.add("b", "51A-123.45")
+    idx.discard("a")
+    assert session_ids(idx.lookup("51A12345")) == ["b"]
+
+
+def test_add_replaces_previous_plate(index):
+    index.add("s1", "30K99999", "card-1")
+    assert index.lookup("51A12345") == []
+    assert session_ids(index.lookup("30K99999")) == ["s1"]
+    assert len(index) == 2
+
+
+def test_session_without_plate_is_counted_but_not_indexed():
+    idx = PlateIndex(max_dist=1)
+    idx.add("s", "", "card")
+    assert len(idx) == 1
+    assert idx._variants == {}
+
+
+def test_load_only_active_sessions(tmp_path):
+    db_path = str(tmp_path / "parking.db")
+    with sqlite3.connect(db_path) as con:
+        con.execute("CREATE TABLE sessions (session_id TEXT, plate_text TEXT, card_id TEXT, status TEXT)")
+        con.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?)", [
+            ("in", "51A-123.45", "c1", "CHECKED_IN"),
+            ("out", "59X1 12345", "c2", "CHECKED_OUT"),
+        ])
+    idx = PlateIndex(max_dist=1)
+    idx.add("stale", "30K99999")
+    assert idx.load(db_path) == 1
+    assert len(idx) == 1
+    assert session_ids(idx.lookup("51A12345")) == ["in"]
+    assert idx.lookup("59X112345") == []
+    assert idx.lookup("30K99999") == []
@@ -0,0 +1,91 @@
+# tests/test_tariff.py
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tariff import TariffEngine
+
+ICT = timezone(timedelta(hours=7))
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return TariffEngine()  # DEFAULT_TARIFF: bands in local time (UTC+7), rounded up to 1000
+
+
+def local(day, hh, mm=0):
+    return datetime(2026, 1, day, hh, mm, tzinfo=ICT).isoformat()
+
+
+def both(engine, vehicle_type, is_guest, time_in, time_out):
+    scalar = engine.compute_fee(vehicle_type, is_guest, time_in, time_out)
+    bulk = engine.compute_fees_bulk([vehicle_type], [is_guest], [time_in], [time_out])[0]
+    assert bulk == scalar
+    return scalar
+
+
+@pytest.mark.parametrize("time_in, time_out, expected", [
+    # night band 15000/h
+    (local(1, 0), local(1, 2), 30000),
+    # same stay written in UTC, with Z, and with a negative offset
+    ("2025-12-31T17:00:00+00:00", "2025-12-31T19:00:00+00:00", 30000),
+    ("2025-12-31T17:00:00Z", "2025-12-31T19:00:00.250000Z", 30000),
+    ("2025-12-31T14:30:00-02:30", "2025-12-31T16:30:00-02:30", 30000),
+    # naive timestamps are UTC
+    ("2025-12-31T17:00:00", "2025-12-31T19:00:00", 30000),
+])
+def test_offsets(engine, time_in, time_out, expected):
+    assert both(engine, "car", True, time_in, time_out) == expected
+
+
+def test_grace_period_is_free(engine):
+    assert both(engine, "car", True, local(1, 10), local(1, 10, 10)) == 0
+
+
+def test_minimum_fee_after_grace(engine):
+    # 11 min of day band = 1833 -> min_fee 20000
+    assert both(engine, "car", True, local(1, 10), local(1, 10, 11)) == 20000
+
+
+def test_rounds_up_to_1000(engine):
+    # motorbike day band 1000/h, 4h10 = 4166.67 -> 5000
+    assert both(engine, "motorbike", True, local(1, 6), local(1, 10, 10)) == 5000
+
+
+def test_daily_cap(engine):
+    # 06:00-24:00: 12h * 10000 + 6h * 15000 = 210000 -> cap 120000
+    assert both(engine, "car", True, local(1, 6), local(2, 0)) == 120000
+
+
+def test_multi_day_stay(engine):
+    # day 1 from 10:00: 170000 -> 120000; day 2 full: 300000 -> 120000;
+    # day 3 until 08:00: 6h * 15000 + 2h * 10000 = 110000
+    assert both(engine, "car", True, local(1, 10), local(3, 8)) == 350000
+
+
+def test_registered_cards_are_free(engine):
+    assert both(engine, "car", False, local(1, 6), local(3, 8)) == 0
+
+
+def test_unknown_vehicle_type_uses_default_plan(engine):
+    assert both(engine, "truck", True, local(1, 6), local(1, 10, 10)) == both(engine, None, True, local(1, 6), local(1, 10, 10))
+
+
+def test_bulk_matches_scalar_on_random_sessions(engine):
+    rng = random.Random(7)
+    offsets = [timezone.utc, ICT, timezone(timedelta(hours=-5)), timezone(timedelta(hours=5, minutes=30))]
+    base = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    vts, guests, tin, tout = [], [], [], []
+    for _ in range(500):
+        start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * 30))
+        end = start + timedelta(minutes=rng.choice([rng.randrange(0, 30), rng.randrange(0, 60 * 24 * 4)]))
+        vts.append(rng.choice(["car", "motorbike", "bicycle", None]))
+        guests.append(rng.random() < 0.8)
+        tin.append(start.astimezone(rng.choice(offsets)).isoformat())
+        tout.append(end.astimezone(rng.choice(offsets)).isoformat())
+    bulk = engine.compute_fees_bulk(vts, guests, tin, tout)
+    scalar = [engine.compute_fee(v, g, a, b) for v, g, a, b in zip(vts, guests, tin, tout)]
+    assert bulk.tolist() == scalar
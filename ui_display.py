@@ -1,13 +1,102 @@
 # ui_display.py
+import os
+import hmac
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
 import cv2
 import numpy as np
 
+
+class _MJPEGServer:
+    """
+    Preview qua HTTP (multipart/x-mixed-replace): mở http://<host>:<port>/?token=<token> bằng trình duyệt.
+    Chỉ encode JPEG khi có người xem; mỗi frame encode 1 lần dùng chung cho mọi client.
+    Mặc định chỉ nghe 127.0.0.1 (UI_MJPEG_HOST=0.0.0.0 để xem từ máy khác trong LAN) và luôn đòi
+    token (UI_MJPEG_TOKEN, mặc định SECRET_KEY) qua ?token= hoặc header X-Secret: ảnh cổng có biển số.
+    """
+
+    def __init__(self, port, quality=70, host=None, token=None):
+        self.quality = int(quality)
+        host = host or os.getenv("UI_MJPEG_HOST", "127.0.0.1")
+        token = token or os.getenv("UI_MJPEG_TOKEN") or os.getenv("SECRET_KEY", "my-very-strong-secret")
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self.clients = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _authorized(self):
+                given = self.headers.get("X-Secret")
+                if given is None:
+                    given = parse_qs(urlsplit(self.path).query).get("token", [""])[0]
+                return hmac.compare_digest(given.encode(), token.encode())
+
+            def do_GET(self):
+                if not self._authorized():
+                    self.send_error(401, "Unauthorized")
+                    return
+                self.send_response(200)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.end_headers()
+                with server._cond:
+                    server.clients += 1
+                seq = 0
+                try:
+                    while True:
+                        with server._cond:
+                            server._cond.wait_for(lambda: server._seq != seq, timeout=5.0)
+                            seq, jpeg = server._seq, server._jpeg
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                        self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._cond:
+                        server.clients -= 1
+
+        self._httpd = ThreadingHTTPServer((host, int(port)), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mjpeg-preview", daemon=True)
+        self._thread.start()
+        print(f"[UI] MJPEG preview on http://{host}:{port}/?token=<UI_MJPEG_TOKEN or SECRET_KEY>")
+
+    def publish(self, img):
+        if self.clients <= 0:
+            return  # không ai xem -> không tốn encode
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = buf.tobytes()
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
 class UIDisplay:
     """
     Điều khiển cửa sổ hiển thị OpenCV:
-      - Gom panel debug + frame
-      - Tự scale về kích thước tối đa (không phóng to)
+      - Gom panel debug + frame vào canvas cấp phát sẵn, vẽ thẳng ở kích thước hiển thị
+        (không vstack full-res rồi resize lại); chỉ tính lại bố cục khi kích thước đổi
+      - Tự scale về kích thước tối đa / kích thước cửa sổ hiện tại (không phóng to)
       - Cho phép kéo/resize cửa sổ (WINDOW_NORMAL|WINDOW_KEEPRATIO)
+      - Giới hạn FPS hiển thị (max_fps) độc lập với tốc độ suy luận
+      - headless: không mở cửa sổ, xem qua MJPEG HTTP (mjpeg_port)
       - Overlay khi mất stream
     """
 
@@ -15,57 +104,137 @@ class UIDisplay:
                  win_name: str = "Parking System - Press Q to quit",
                  max_width: int = 900,
                  max_height: int = 650,
-                 allow_resize: bool = True):
+                 allow_resize: bool = True,
+                 max_fps: float | None = None,
+                 mjpeg_port: int | None = None,
+                 headless: bool | None = None):
         self.win_name = win_name
         self.max_w = int(max_width)
         self.max_h = int(max_height)
+        self.max_fps = float(os.getenv("UI_MAX_FPS", "15") if max_fps is None else max_fps)
+        if mjpeg_port is None and os.getenv("UI_MJPEG_PORT"):
+            mjpeg_port = int(os.getenv("UI_MJPEG_PORT"))
+        self.headless = (os.getenv("UI_HEADLESS", "0") == "1") if headless is None else headless
+
+        self._canvas = None     # ảnh hiển thị cấp phát sẵn
+        self._layout = None     # (key, disp_w, panel_dh, frame_dh)
+        self._last_show = 0.0
+        self._win_size = None   # (w, h) cửa sổ lần kiểm tra trước
+        self._win_checked = 0.0
+        self._lost_img = None
+
+        self._mjpeg = _MJPEGServer(mjpeg_port) if mjpeg_port else None
+        if not self.headless:
+            flags = cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO if allow_resize else cv2.WINDOW_AUTOSIZE
+            cv2.namedWindow(self.win_name, flags)
+            cv2.resizeWindow(self.win_name, self.max_w, self.max_h)
+
+    # ---- bố cục ----
+    def _limits(self):
+        """Giới hạn hiển thị: max size, và kích thước cửa sổ hiện tại nếu người dùng đã kéo nhỏ."""
+        if self.headless:
+            return self.max_w, self.max_h
+        now = time.monotonic()
+        if now - self._win_checked > 0.5:  # hỏi kích thước cửa sổ thưa thôi
+            self._win_checked = now
+            try:
+                _, _, w, h = cv2.getWindowImageRect(self.win_name)
+                if w > 0 and h > 0:
+                    self._win_size = (w, h)
+            except cv2.error:
+                pass
+        if self._win_size:
+            return min(self.max_w, self._win_size[0]), min(self.max_h, self._win_size[1])
+        return self.max_w, self.max_h
+
+    def _plan(self, frame_shape, panel_shape):
+        """-> (disp_w, panel_dh, frame_dh); panel co theo bề rộng frame như bản vstack cũ."""
+        fh, fw = frame_shape[:2]
+        ph = 0
+        if panel_shape is not None:
+            ph = int(panel_shape[0] * fw / panel_shape[1])
+        max_w, max_h = self._limits()
+        key = (fh, fw, ph, max_w, max_h)
+        if self._layout is None or self._layout[0] != key:
+            scale = min(max_w / fw, max_h / (fh + ph), 1.0)  # không phóng to
+            disp_w = max(1, int(fw * scale))
+            panel_dh = int(ph * scale)
+            frame_dh = max(1, int(fh * scale))
+            self._layout = (key, disp_w, panel_dh, frame_dh)
+            self._canvas = np.zeros((panel_dh + frame_dh, disp_w, 3), dtype=np.uint8)
+        return self._layout[1:]
 
-        flags = cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO if allow_resize else cv2.WINDOW_AUTOSIZE
-        cv2.namedWindow(self.win_name, flags)
-        cv2.resizeWindow(self.win_name, self.max_w, self.max_h)
-
-    def _stack(self, panel: np.ndarray | None, frame: np.ndarray) -> np.ndarray:
-        if panel is None:
-            return frame
-        pw, fw = panel.shape[1], frame.shape[1]
-        if pw != fw:
-            scale = fw / pw
-            ph = int(panel.shape[0] * scale)
-            panel = cv2.resize(panel, (fw, ph))
-        return np.vstack((panel, frame))
-
-    def _fit_to_max(self, img: np.ndarray) -> np.ndarray:
-        h, w = img.shape[:2]
-        scale = min(self.max_w / w, self.max_h / h, 1.0)  # không phóng to
-        if scale < 1.0:
-            return cv2.resize(img, (int(w * scale), int(h * scale)))
-        return img
-
-    def render(self, frame: np.ndarray, panel: np.ndarray | None = None) -> None:
-        combined = self._stack(panel, frame)
-        disp = self._fit_to_max(combined)
-        cv2.imshow(self.win_name, disp)
-
-    def render_image(self, img: np.ndarray) -> None:
-        disp = self._fit_to_max(img)
-        cv2.imshow(self.win_name, disp)
+    @staticmethod
+    def _blit(src, dst):
+        if src.ndim == 2:
+            src = cv2.cvtColor(src, cv2.COLOR_GRAY2BGR)
+        if src.shape[:2] == dst.shape[:2]:
+            np.copyto(dst, src)
+        else:
+            cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_LINEAR)
+
+    def _due(self):
+        if self.max_fps <= 0:
+            return True
+        now = time.monotonic()
+        if now - self._last_show < 1.0 / self.max_fps:
+            return False
+        self._last_show = now
+        return True
+
+    def _show(self, img):
+        if not self.headless:
+            cv2.imshow(self.win_name, img)
+        if self._mjpeg is not None:
+            self._mjpeg.publish(img)
+
+    # ---- API ----
+    def render(self, frame: np.ndarray, panel: np.ndarray | None = None) -> bool:
+        """Vẽ frame (+ panel phía trên). Trả False nếu bỏ qua do giới hạn FPS."""
+        if not self._due():
+            return False
+        disp_w, panel_dh, frame_dh = self._plan(frame.shape, None if panel is None else panel.shape)
+        canvas = self._canvas
+        if panel is not None and panel_dh > 0:
+            self._blit(panel, canvas[:panel_dh])
+        self._blit(frame, canvas[panel_dh:])
+        self._show(canvas)
+        return True
+
+    def render_image(self, img: np.ndarray) -> bool:
+        return self.render(img)
 
     def show_stream_lost(self, width: int, height: int, panel_h: int = 0) -> None:
-        H = int(height + panel_h)
-        W = int(width)
-        black = np.zeros((max(100, H), max(200, W), 3), dtype="uint8")
-        cv2.putText(
-            black, "STREAM LOST - CHECK CAMERA URL/IP",
-            (40, max(40, H // 2)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2
-        )
-        self.render_image(black)
+        H = max(100, int(height + panel_h))
+        W = max(200, int(width))
+        if self._lost_img is None or self._lost_img.shape[:2] != (H, W):
+            black = np.zeros((H, W, 3), dtype="uint8")
+            cv2.putText(
+                black, "STREAM LOST - CHECK CAMERA URL/IP",
+                (40, max(40, H // 2)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2
+            )
+            self._lost_img = black
+        self.render_image(self._lost_img)
+
+    def wait_key(self, delay_ms: int = 1) -> int:
+        """cv2.waitKey khi có cửa sổ; headless thì chỉ ngủ (bản OpenCV headless không có waitKey)."""
+        if self.headless:
+            time.sleep(max(delay_ms, 1) / 1000.0)
+            return -1
+        return cv2.waitKey(delay_ms)
 
     def set_max_size(self, max_width: int, max_height: int) -> None:
         self.max_w = int(max_width)
         self.max_h = int(max_height)
-        cv2.resizeWindow(self.win_name, self.max_w, self.max_h)
+        self._layout = None
+        if not self.headless:
+            cv2.resizeWindow(self.win_name, self.max_w, self.max_h)
 
     def close(self) -> None:
+        if self._mjpeg is not None:
+            self._mjpeg.close()
+        if self.headless:
+            return
         try:
             cv2.destroyWindow(self.win_name)
         except: